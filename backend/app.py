@@ -1,51 +1,240 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, Response, current_app, g, has_app_context, has_request_context, request, jsonify, send_from_directory, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload, make_transient_to_detached
 from flask_cors import CORS
-from flask_migrate import Migrate, upgrade
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from itsdangerous import BadSignature, TimestampSigner
+from flask_migrate import Migrate
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, current_user, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import PyJWTError
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
+from urllib.parse import urlencode
 import os
 import uuid
+import base64
+import json
+import re
+import hashlib
+import io
+import csv
+import time
+import click
+import math
+import random
+import hmac
+from functools import wraps
+from contextlib import contextmanager, nullcontext
 import cloudinary
+import cloudinary.exceptions
 import cloudinary.uploader
+import http.client
+from python_http_client.exceptions import HTTPError as SendGridHTTPError
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 from dotenv import load_dotenv
+from cache import LRUCache
+from metrics import Registry
+from resilience import CircuitBreaker, ExternalService, ServiceUnavailableError
+from serialization import JSONProvider, Nested, Serializer, UnknownFieldError, attr, isoformat, parse_fields
+from storage import CloudinaryStorage, LocalStorage, UploadVerificationError
+import geo
 
 
 load_dotenv()
 
+from config import config
 
-app = Flask(__name__)
 
+# Pagination
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+MAX_CART_BATCH_SIZE = 100
+DEFAULT_RADIUS_KM = 50
+MAX_RADIUS_KM = 1000
 
-# Configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
+# Sales analytics
+ANALYTICS_INTERVALS = ('day', 'week', 'month')
+DEFAULT_ANALYTICS_DAYS = 90
+MAX_ANALYTICS_DAYS = 3660
+# Rollup bucket for order items that predate the animal_type snapshot
+UNKNOWN_ANIMAL_TYPE = 'Unknown'
 
 
-# Initialize extensions
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-jwt = JWTManager(app)
-CORS(app)
+# Cache of rendered animal listing responses, cleared whenever listings change
+listing_cache = LRUCache()
 
-with app.app_context():
-    upgrade()
 
-# Configure Cloudinary
-cloudinary.config(
-   cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
-   api_key=os.getenv('CLOUDINARY_API_KEY'),
-   api_secret=os.getenv('CLOUDINARY_API_SECRET')
+# Column snapshots of recently authenticated users, keyed by id
+user_cache = LRUCache()
+
+
+# Users who wrote within REPLICA_STICKY_SECONDS, whose reads stay on the primary.
+# This only covers the worker that handled the write; clients carry the rest
+# in the PRIMARY_READ_HEADER token that remember_writer hands back.
+recent_writers = LRUCache(max_entries=10000)
+PRIMARY_READ_HEADER = 'X-Primary-Read'
+
+
+# Request, SQL and external call metrics served by /metrics
+metrics_registry = Registry()
+request_duration = metrics_registry.histogram(
+   'farmart_http_request_duration_seconds', 'Request latency by route', ['endpoint', 'method', 'status']
+)
+db_time = metrics_registry.histogram(
+   'farmart_db_time_seconds', 'Time spent executing SQL per request', ['endpoint']
+)
+db_queries = metrics_registry.histogram(
+   'farmart_db_queries_per_request', 'SQL statements executed per request', ['endpoint'],
+   buckets=(1, 2, 3, 5, 8, 13, 21, 50, 100)
 )
+slow_queries = metrics_registry.counter(
+   'farmart_slow_queries_total', 'SQL statements slower than SLOW_QUERY_MS', ['endpoint']
+)
+external_call_duration = metrics_registry.histogram(
+   'farmart_external_call_duration_seconds', 'Latency of calls to external services', ['service', 'operation', 'outcome']
+)
+unhandled_errors = metrics_registry.counter(
+   'farmart_unhandled_errors_total', 'Requests answered 500 after an unexpected exception', ['endpoint']
+)
+
+
+# Messages of the bare cloudinary Error the uploader raises when the call itself
+# failed (connection, timeout, unreadable response), as opposed to an API rejection
+CLOUDINARY_TRANSPORT_ERRORS = ('Unexpected error', 'Socket error', 'Error parsing server response')
+
+
+def provider_fault(e):
+   """Whether an error counts against a provider's health.
+
+   Outages, timeouts, connection failures and rate limiting do; requests the
+   provider rejected (bad input, missing or duplicate resources, auth) and
+   errors raised by our own code do not.
+   """
+   if isinstance(e, (cloudinary.exceptions.GeneralError, cloudinary.exceptions.RateLimited)):
+       return True
+   if isinstance(e, cloudinary.exceptions.Error):
+       # BadRequest, NotFound, NotAllowed, AlreadyExists, AuthorizationRequired,
+       # or a bare Error carrying the API's message for a rejected upload
+       return type(e) is cloudinary.exceptions.Error and str(e).startswith(CLOUDINARY_TRANSPORT_ERRORS)
+   if isinstance(e, SendGridHTTPError):
+       return e.status_code >= 500 or e.status_code == 429
+   # SendGrid's client lets network failures through unwrapped: URLError,
+   # timeouts and connection resets are all OSErrors
+   return isinstance(e, (OSError, http.client.HTTPException))
+
+
+# Bulkhead and circuit breaker per external provider, sized from the config in create_app
+external_services = {
+   'cloudinary': ExternalService('cloudinary', is_failure=provider_fault),
+   'sendgrid': ExternalService('sendgrid', is_failure=provider_fault)
+}
+CIRCUIT_STATES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+external_call_rejections = metrics_registry.counter(
+   'farmart_external_call_rejections_total', 'Calls turned away by a full bulkhead or an open circuit', ['service', 'reason']
+)
+circuit_state = metrics_registry.gauge(
+   'farmart_circuit_state', 'Circuit breaker state per provider: 0 closed, 1 half open, 2 open', ['service'],
+   collect=lambda: {(name,): CIRCUIT_STATES[service.breaker.state] for name, service in external_services.items()}
+)
+external_calls_in_flight = metrics_registry.gauge(
+   'farmart_external_calls_in_flight', 'Calls currently holding a bulkhead slot', ['service'],
+   collect=lambda: {(name,): service.bulkhead.in_flight for name, service in external_services.items()}
+)
+
+
+def include_schema_object(object, name, type_, reflected, compare_to):
+   """Hide the migration-managed full-text index objects from autogenerate"""
+   if type_ == 'table' and name.startswith('animals_fts'):
+       return False
+   if name in ('search_vector', 'ix_animals_search_vector'):
+       return False
+   return True
+
+
+class RoutingSession(Session):
+   """Session that sends a request's reads to the replica bind chosen by replica_read.
+
+   Flushes and DML statements always go to the primary, as does everything
+   outside a replica_read view.
+   """
+
+   def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+       if bind is None and not self._flushing and has_app_context():
+           key = g.get('db_bind')
+           if key is not None and not getattr(clause, 'is_dml', False):
+               return self._db.engines[key]
+       return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
 
+# Extensions, bound to an application in create_app
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+migrate = Migrate(include_object=include_schema_object)
+jwt = JWTManager()
+cors = CORS(expose_headers=['X-Next-Cursor', 'Link', 'Server-Timing', PRIMARY_READ_HEADER])
+api = Blueprint('api', __name__, cli_group=None)
 
-# SendGrid configuration
-sg = SendGridAPIClient(api_key=os.getenv('SENDGRID_API_KEY'))
+
+# External clients are built on first use so that importing the app and
+# booting a worker never touch the network
+_sendgrid_client = None
+_cloudinary_configured = False
+_gazetteer = None
+
+
+def get_sendgrid_client():
+   global _sendgrid_client
+   if _sendgrid_client is None:
+       _sendgrid_client = SendGridAPIClient(
+           api_key=current_app.config['SENDGRID_API_KEY'],
+           host=current_app.config['SENDGRID_API_HOST']
+       )
+       # Endpoint clients are built lazily from this one and inherit its timeout
+       _sendgrid_client.client.timeout = current_app.config['SENDGRID_TIMEOUT']
+   return _sendgrid_client
+
+
+def get_cloudinary_uploader():
+   global _cloudinary_configured
+   if not _cloudinary_configured:
+       cloudinary.config(
+           cloud_name=current_app.config['CLOUDINARY_CLOUD_NAME'],
+           api_key=current_app.config['CLOUDINARY_API_KEY'],
+           api_secret=current_app.config['CLOUDINARY_API_SECRET'],
+           upload_prefix=current_app.config['CLOUDINARY_API_HOST']
+       )
+       _cloudinary_configured = True
+   return cloudinary.uploader
+
+
+def get_gazetteer():
+   global _gazetteer
+   if _gazetteer is None:
+       _gazetteer = geo.Gazetteer(current_app.config['GAZETTEER_PATH'])
+   return _gazetteer
+
+
+def get_storage():
+   """Storage backend for signed direct uploads, chosen by STORAGE_BACKEND"""
+   if current_app.config['STORAGE_BACKEND'] == 'local':
+       return LocalStorage(
+           root=current_app.config['LOCAL_STORAGE_ROOT'],
+           base_url=current_app.config['LOCAL_STORAGE_URL'] or (
+               f"{request.host_url}api/storage/local" if has_request_context() else ''
+           ),
+           secret=current_app.config['SECRET_KEY']
+       )
+   return CloudinaryStorage(
+       cloud_name=current_app.config['CLOUDINARY_CLOUD_NAME'],
+       api_key=current_app.config['CLOUDINARY_API_KEY'],
+       api_secret=current_app.config['CLOUDINARY_API_SECRET'],
+       api_host=current_app.config['CLOUDINARY_API_HOST'],
+       timeout=current_app.config['CLOUDINARY_TIMEOUT']
+   )
 
 
 # Models
@@ -59,6 +248,10 @@ class User(db.Model):
    user_type = db.Column(db.String(20), nullable=False)  # 'farmer' or 'buyer'
    phone = db.Column(db.String(20), nullable=False)
    location = db.Column(db.String(200), nullable=False)
+   # Geocoded from location; geo_cell is the spatial grid cell used by radius searches
+   latitude = db.Column(db.Float, nullable=True)
+   longitude = db.Column(db.Float, nullable=True)
+   geo_cell = db.Column(db.Integer, nullable=True, index=True)
    profile_image = db.Column(db.String(500), nullable=True)
    is_verified = db.Column(db.Boolean, default=False)
    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -67,10 +260,16 @@ class User(db.Model):
    animals = db.relationship('Animal', backref='farmer', lazy=True, cascade='all, delete-orphan')
    orders = db.relationship('Order', backref='buyer', lazy=True, cascade='all, delete-orphan')
    cart_items = db.relationship('CartItem', backref='user', lazy=True, cascade='all, delete-orphan')
+   stats = db.relationship('UserStats', uselist=False, lazy=True, cascade='all, delete-orphan')
+   reservations = db.relationship('Reservation', lazy=True, cascade='all, delete-orphan')
 
 
 class Animal(db.Model):
    __tablename__ = 'animals'
+   __table_args__ = (
+       db.Index('ix_animals_status_created_at', 'status', 'created_at', 'id'),
+       db.Index('ix_animals_farmer_id_status', 'farmer_id', 'status'),
+   )
   
    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
    name = db.Column(db.String(100), nullable=False)
@@ -87,10 +286,16 @@ class Animal(db.Model):
    farmer_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
    created_at = db.Column(db.DateTime, default=datetime.utcnow)
    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+  
+   # Relationships
+   reservation = db.relationship('Reservation', uselist=False, lazy=True, cascade='all, delete-orphan')
 
 
 class CartItem(db.Model):
    __tablename__ = 'cart_items'
+   __table_args__ = (
+       db.UniqueConstraint('user_id', 'animal_id', name='uq_cart_items_user_id_animal_id'),
+   )
   
    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
@@ -104,6 +309,9 @@ class CartItem(db.Model):
 
 class Order(db.Model):
    __tablename__ = 'orders'
+   __table_args__ = (
+       db.Index('ix_orders_user_id_created_at', 'user_id', 'created_at'),
+   )
   
    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
@@ -122,11 +330,16 @@ class Order(db.Model):
 
 class OrderItem(db.Model):
    __tablename__ = 'order_items'
+   __table_args__ = (
+       db.Index('ix_order_items_order_id', 'order_id'),
+       db.Index('ix_order_items_farmer_id_order_id', 'farmer_id', 'order_id'),
+   )
   
    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
    order_id = db.Column(db.String(36), db.ForeignKey('orders.id'), nullable=False)
    animal_id = db.Column(db.String(36), db.ForeignKey('animals.id'), nullable=False)
    animal_name = db.Column(db.String(100), nullable=False)
+   animal_type = db.Column(db.String(50))
    quantity = db.Column(db.Integer, nullable=False)
    price = db.Column(db.Float, nullable=False)
    farmer_id = db.Column(db.String(36), nullable=False)
@@ -136,107 +349,1220 @@ class OrderItem(db.Model):
    animal = db.relationship('Animal', backref='order_items')
 
 
+class Reservation(db.Model):
+   """A buyer's time-limited hold on an animal in their cart; one holder per animal"""
+   __tablename__ = 'reservations'
+   __table_args__ = (
+       db.Index('ix_reservations_expires_at', 'expires_at'),
+       db.Index('ix_reservations_user_id', 'user_id'),
+   )
+  
+   animal_id = db.Column(db.String(36), db.ForeignKey('animals.id'), primary_key=True)
+   user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+   expires_at = db.Column(db.DateTime, nullable=False)
+   created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class Upload(db.Model):
+   """An image upload signed for a user; the URL is recorded once the upload is confirmed"""
+   __tablename__ = 'uploads'
+  
+   id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+   user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+   public_id = db.Column(db.String(255), unique=True, nullable=False)
+   url = db.Column(db.String(500), nullable=True)
+   # 'pending', 'confirmed', then 'attached' or 'orphaned' once garbage collection has
+   # checked it against the uploader's listings; 'deleted' once the image is removed
+   status = db.Column(db.String(20), default='pending')
+   expires_at = db.Column(db.DateTime, nullable=False)
+   created_at = db.Column(db.DateTime, default=datetime.utcnow)
+   confirmed_at = db.Column(db.DateTime, nullable=True)
+
+
+class EmailOutbox(db.Model):
+   __tablename__ = 'email_outbox'
+   __table_args__ = (
+       db.Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+   )
+  
+   id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+   to_email = db.Column(db.String(120), nullable=False)
+   subject = db.Column(db.String(255), nullable=False)
+   html_content = db.Column(db.Text, nullable=False)
+   status = db.Column(db.String(20), default='pending')  # 'pending', 'sending', 'sent' or 'failed'
+   attempts = db.Column(db.Integer, default=0)
+   last_error = db.Column(db.Text, nullable=True)
+   next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+   created_at = db.Column(db.DateTime, default=datetime.utcnow)
+   sent_at = db.Column(db.DateTime, nullable=True)
+
+
+class ImageDeletion(db.Model):
+   """A stored image queued for deletion by the background worker"""
+   __tablename__ = 'image_deletions'
+   __table_args__ = (
+       db.Index('ix_image_deletions_status_next_attempt_at', 'status', 'next_attempt_at'),
+   )
+  
+   id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+   public_id = db.Column(db.String(255), unique=True, nullable=False)
+   status = db.Column(db.String(20), default='pending')  # 'pending', 'deleting', 'deleted' or 'failed'
+   attempts = db.Column(db.Integer, default=0)
+   last_error = db.Column(db.Text, nullable=True)
+   next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+   created_at = db.Column(db.DateTime, default=datetime.utcnow)
+   deleted_at = db.Column(db.DateTime, nullable=True)
+
+
+class UserStats(db.Model):
+   """Dashboard counters, maintained incrementally by bump_stats"""
+   __tablename__ = 'user_stats'
+  
+   user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+   # Farmer counters
+   total_animals = db.Column(db.Integer, nullable=False, default=0)
+   available_animals = db.Column(db.Integer, nullable=False, default=0)
+   sold_animals = db.Column(db.Integer, nullable=False, default=0)
+   total_revenue = db.Column(db.Float, nullable=False, default=0)
+   pending_orders = db.Column(db.Integer, nullable=False, default=0)
+   # Buyer counters
+   cart_items = db.Column(db.Integer, nullable=False, default=0)
+   total_orders = db.Column(db.Integer, nullable=False, default=0)
+   total_spent = db.Column(db.Float, nullable=False, default=0)
+   updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class FarmerDailySales(db.Model):
+   """Completed sales per farmer, order day (UTC) and animal type, maintained by bump_daily_sales"""
+   __tablename__ = 'farmer_daily_sales'
+  
+   farmer_id = db.Column(db.String(36), primary_key=True)
+   day = db.Column(db.Date, primary_key=True)
+   animal_type = db.Column(db.String(50), primary_key=True)
+   revenue = db.Column(db.Float, nullable=False, default=0)
+   units = db.Column(db.Integer, nullable=False, default=0)
+   # Orders with at least one item of this type
+   orders = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Full-text search index. On PostgreSQL this is the animals.search_vector
+# tsvector column (GIN indexed); on SQLite it is the animals_fts FTS5 table.
+# Both are created by migration and kept outside db.metadata so create_all
+# never tries to build them as ordinary tables.
+animals_fts = sa.Table(
+   'animals_fts', sa.MetaData(),
+   sa.Column('animal_id', sa.String(36)),
+   sa.Column('name', sa.Text),
+   sa.Column('type', sa.Text),
+   sa.Column('breed', sa.Text),
+   sa.Column('description', sa.Text)
+)
+
+SEARCH_VECTOR_SQL = """
+   setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+   setweight(to_tsvector('english', coalesce(type, '') || ' ' || coalesce(breed, '')), 'B') ||
+   setweight(to_tsvector('english', coalesce(description, '')), 'C')
+"""
+
+
+@jwt.user_lookup_loader
+def load_current_user(jwt_header, jwt_data):
+   """Resolve the token's user once per request, served from user_cache when possible"""
+   user_id = jwt_data['sub']
+   values = user_cache.get(user_id)
+   if values is None:
+       # From the primary, so a user who just signed up is found despite replica lag
+       with on_primary():
+           user = db.session.get(User, user_id)
+       if user is not None:
+           user_cache.set(user_id, {column.key: getattr(user, column.key) for column in User.__table__.columns})
+       return user
+  
+   # Attach a copy of the snapshot to this request's session without a query
+   user = User(**values)
+   make_transient_to_detached(user)
+   return db.session.merge(user, load=False)
+
+
+@jwt.user_lookup_error_loader
+def current_user_not_found(jwt_header, jwt_data):
+   return jsonify({'message': 'User not found'}), 404
+
+
+@sa.event.listens_for(User, 'after_update')
+@sa.event.listens_for(User, 'after_delete')
+def invalidate_cached_user(mapper, connection, user):
+   user_cache.pop(user.id)
+
+
+# Eager-loading profiles: the relationships each serializer walks, so list
+# endpoints issue a fixed number of queries instead of one per row
+def animal_loader():
+   return [joinedload(Animal.farmer)]
+
+
+def cart_item_loader():
+   return [joinedload(CartItem.animal).joinedload(Animal.farmer)]
+
+
+def order_loader():
+   return [selectinload(Order.items)]
+
+
+# Instrumentation
+def current_endpoint():
+   return (request.endpoint or 'unmatched') if has_request_context() else 'background'
+
+
+@sa.event.listens_for(sa.engine.Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+   conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@sa.event.listens_for(sa.engine.Engine, 'after_cursor_execute')
+def record_query(conn, cursor, statement, parameters, context, executemany):
+   """Add each statement to the request's SQL totals and log the slow ones"""
+   elapsed = time.perf_counter() - conn.info['query_started'].pop()
+   if not has_app_context():
+       return
+   g.db_queries = g.get('db_queries', 0) + 1
+   g.db_time = g.get('db_time', 0.0) + elapsed
+   if elapsed * 1000 >= current_app.config['SLOW_QUERY_MS']:
+       endpoint = current_endpoint()
+       slow_queries.inc(endpoint=endpoint)
+       current_app.logger.warning('Slow query (%.1f ms) in %s: %s', elapsed * 1000, endpoint, ' '.join(statement.split())[:1000])
+
+
+@sa.event.listens_for(sa.engine.Engine, 'handle_error')
+def discard_query_timer(context):
+   started = context.connection.info.get('query_started') if context.connection is not None else None
+   if started:
+       started.pop()
+
+
+@contextmanager
+def external_call(service, operation):
+   """Run a call to an external service under its bulkhead and circuit breaker, timing
+   it into the metrics and the request's Server-Timing; raises ServiceUnavailableError
+   when the call is turned away"""
+   guarded = external_services.get(service)
+   started = time.perf_counter()
+   outcome = 'error'
+   try:
+       with guarded.guard() if guarded else nullcontext():
+           yield
+       outcome = 'ok'
+   except ServiceUnavailableError as e:
+       outcome = 'rejected'
+       external_call_rejections.inc(service=service, reason=e.reason)
+       raise
+   finally:
+       elapsed = time.perf_counter() - started
+       external_call_duration.observe(elapsed, service=service, operation=operation, outcome=outcome)
+       if has_app_context():
+           g.external_time = g.get('external_time', 0.0) + elapsed
+
+
+def server_error(e, message='Server error'):
+   """Log an unexpected handler exception with its endpoint and answer 500"""
+   endpoint = current_endpoint()
+   unhandled_errors.inc(endpoint=endpoint)
+   current_app.logger.error('Unhandled error in %s', endpoint, exc_info=e)
+   return jsonify({'message': message}), 500
+
+
+@api.before_app_request
+def start_request_timer():
+   g.request_started = time.perf_counter()
+   g.db_queries = 0
+   g.db_time = 0.0
+   g.external_time = 0.0
+
+
+@api.after_app_request
+def record_request_metrics(response):
+   """Record the request in the route histograms and describe it in a Server-Timing header.
+
+   Streamed bodies are produced after this runs, so their SQL is not included.
+   """
+   if 'request_started' not in g:
+       return response
+   elapsed = time.perf_counter() - g.request_started
+   endpoint = current_endpoint()
+   request_duration.observe(elapsed, endpoint=endpoint, method=request.method, status=str(response.status_code))
+   db_time.observe(g.db_time, endpoint=endpoint)
+   db_queries.observe(g.db_queries, endpoint=endpoint)
+   response.headers['Server-Timing'] = ', '.join([
+       f'db;dur={g.db_time * 1000:.1f};desc="{g.db_queries} queries on {g.get("db_bind") or "primary"}"',
+       f'ext;dur={g.external_time * 1000:.1f}',
+       f'total;dur={elapsed * 1000:.1f}'
+   ])
+   return response
+
+
 # Helper functions
+def queue_email(to_email, subject, html_content):
+   """Add an email to the outbox; it is sent once the current transaction commits"""
+   db.session.add(EmailOutbox(
+       id=str(uuid.uuid4()),
+       to_email=to_email,
+       subject=subject,
+       html_content=html_content
+   ))
+
+
 def send_email(to_email, subject, html_content):
-   """Send email using SendGrid"""
+   """Send email using SendGrid, raising on failure (used by the outbox worker)"""
+   message = Mail(
+       from_email=current_app.config['FROM_EMAIL'],
+       to_emails=to_email,
+       subject=subject,
+       html_content=html_content
+   )
+   with external_call('sendgrid', 'send'):
+       get_sendgrid_client().send(message)
+
+
+def cached_listing(view):
+   """Serve a GET view from listing_cache keyed on its path and normalized query
+   string, tag it with an ETag, and answer conditional requests with 304"""
+   @wraps(view)
+   def wrapper(*args, **kwargs):
+       key = (request.path, tuple(sorted((k, v) for k, v in request.args.items(multi=True) if v)))
+       cached = listing_cache.get(key)
+       if cached is None:
+           response = view(*args, **kwargs)
+           if isinstance(response, tuple) or response.status_code != 200:
+               return response
+           response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+           listing_cache.set(key, (response.get_data(), dict(response.headers)))
+       else:
+           body, headers = cached
+           response = current_app.response_class(body, headers=headers)
+       return response.make_conditional(request)
+   return wrapper
+
+
+def request_identity():
+   """The caller's user id when the request carries a valid access token, else None"""
    try:
-       message = Mail(
-           from_email=os.getenv('FROM_EMAIL', 'noreply@farmart.com'),
-           to_emails=to_email,
-           subject=subject,
-           html_content=html_content
-       )
-       response = sg.send(message)
+       verify_jwt_in_request(optional=True)
+   except (JWTExtendedException, PyJWTError):
+       return None
+   return get_jwt_identity()
+
+
+def replica_binds():
+   return [key for key in current_app.config['SQLALCHEMY_BINDS'] if key.startswith('replica_')]
+
+
+def read_from_replica():
+   """Whether this request's reads may be served by a replica.
+
+   Not within REPLICA_STICKY_SECONDS of a write by the same user, so writers
+   read their own writes; nor of a listing change in this worker, so the
+   listing cache is not refilled from a replica that has yet to see it.
+   """
+   sticky = current_app.config['REPLICA_STICKY_SECONDS']
+   if listing_cache.cleared_at is not None and time.monotonic() - listing_cache.cleared_at < sticky:
+       return False
+   token = request.headers.get(PRIMARY_READ_HEADER)
+   if not token and not len(recent_writers):
        return True
-   except Exception as e:
-       print(f"Email sending failed: {e}")
+   user_id = request_identity()
+   if user_id is None:
+       return True
+   if recent_writers.get(user_id):
        return False
+   if token:
+       try:
+           return primary_read_signer().unsign(token, max_age=sticky).decode() != user_id
+       except BadSignature:
+           pass
+   return True
+
+
+def primary_read_signer():
+   """Signs the user id in PRIMARY_READ_HEADER tokens, which expire after REPLICA_STICKY_SECONDS"""
+   return TimestampSigner(current_app.config['SECRET_KEY'], salt='primary-read')
+
+
+def replica_read(view):
+   """Route a read-only view's queries to a randomly chosen replica when the
+   read-after-write policy allows it (see read_from_replica)"""
+   @wraps(view)
+   def wrapper(*args, **kwargs):
+       binds = replica_binds()
+       if binds and read_from_replica():
+           g.db_bind = random.choice(binds)
+       return view(*args, **kwargs)
+   return wrapper
+
+
+@contextmanager
+def on_primary():
+   """Send the enclosed queries to the primary even inside a replica_read view"""
+   previous = g.pop('db_bind', None)
+   try:
+       yield
+   finally:
+       if previous is not None:
+           g.db_bind = previous
+
+
+@api.after_app_request
+def remember_writer(response):
+   """Keep a user's reads on the primary for a moment after they change something.
+
+   The token in PRIMARY_READ_HEADER lets every worker honour that; clients
+   send the latest one back on their following requests.
+   """
+   if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400 and replica_binds():
+       user_id = g.get('writer_id') or request_identity()
+       if user_id is not None:
+           recent_writers.set(user_id, True)
+           response.headers[PRIMARY_READ_HEADER] = primary_read_signer().sign(user_id).decode()
+   return response
+
+
+STATS_COLUMNS = (
+   'total_animals', 'available_animals', 'sold_animals', 'total_revenue', 'pending_orders',
+   'cart_items', 'total_orders', 'total_spent'
+)
 
 
-def serialize_user(user):
-   return {
-       'id': user.id,
-       'email': user.email,
-       'name': user.name,
-       'userType': user.user_type,
-       'phone': user.phone,
-       'location': user.location,
-       'profileImage': user.profile_image,
-       'isVerified': user.is_verified,
-       'createdAt': user.created_at.isoformat()
-   }
+def compute_user_stats(user_ids=None):
+   """Recompute dashboard counters from the source tables, for all users or the given ids"""
+   def scoped(query, column):
+       return query.filter(column.in_(user_ids)) if user_ids is not None else query
+  
+   users = scoped(db.session.query(User.id), User.id)
+   stats = {user_id: dict.fromkeys(STATS_COLUMNS, 0) for (user_id,) in users}
+  
+   animal_counts = scoped(
+       db.session.query(Animal.farmer_id, Animal.status, db.func.count(Animal.id)),
+       Animal.farmer_id
+   ).group_by(Animal.farmer_id, Animal.status)
+   for farmer_id, status, count in animal_counts:
+       stats[farmer_id]['total_animals'] += count
+       if status in ('available', 'sold'):
+           stats[farmer_id][f'{status}_animals'] += count
+  
+   revenue = scoped(
+       db.session.query(OrderItem.farmer_id, db.func.sum(OrderItem.price * OrderItem.quantity)),
+       OrderItem.farmer_id
+   ).join(Order).filter(Order.status == 'completed').group_by(OrderItem.farmer_id)
+   for farmer_id, total in revenue:
+       if farmer_id in stats:
+           stats[farmer_id]['total_revenue'] = total or 0
+  
+   pending = scoped(
+       db.session.query(OrderItem.farmer_id, db.func.count(db.distinct(Order.id))),
+       OrderItem.farmer_id
+   ).join(Order).filter(Order.status == 'pending').group_by(OrderItem.farmer_id)
+   for farmer_id, count in pending:
+       if farmer_id in stats:
+           stats[farmer_id]['pending_orders'] = count
+  
+   cart_counts = scoped(
+       db.session.query(CartItem.user_id, db.func.count(CartItem.id)),
+       CartItem.user_id
+   ).group_by(CartItem.user_id)
+   for user_id, count in cart_counts:
+       stats[user_id]['cart_items'] = count
+  
+   orders = scoped(
+       db.session.query(
+           Order.user_id,
+           db.func.count(Order.id),
+           db.func.sum(db.case((Order.status == 'completed', Order.total_amount), else_=0))
+       ),
+       Order.user_id
+   ).group_by(Order.user_id)
+   for user_id, count, spent in orders:
+       stats[user_id]['total_orders'] = count
+       stats[user_id]['total_spent'] = spent or 0
+  
+   return stats
 
 
-def serialize_animal(animal):
-   return {
-       'id': animal.id,
-       'name': animal.name,
-       'type': animal.type,
-       'breed': animal.breed,
-       'age': animal.age,
-       'weight': animal.weight,
-       'price': animal.price,
-       'description': animal.description,
-       'images': animal.images,
-       'healthStatus': animal.health_status,
-       'vaccinationStatus': animal.vaccination_status,
-       'status': animal.status,
-       'farmerId': animal.farmer_id,
-       'farmerName': animal.farmer.name,
-       'farmerLocation': animal.farmer.location,
-       'farmerPhone': animal.farmer.phone,
-       'createdAt': animal.created_at.isoformat(),
-       'updatedAt': animal.updated_at.isoformat()
-   }
+def bump_stats(user_id, **deltas):
+   """Atomically add deltas to a user's dashboard counters in the current transaction.
 
+   Users without a counters row yet are skipped; get_dashboard_stats builds
+   their row from the source tables on first read, which already reflects
+   every change made before then.
+   """
+   bump_stats_many([user_id], **deltas)
 
-def serialize_cart_item(cart_item):
+
+def bump_stats_many(user_ids, **deltas):
+   """bump_stats for several users at once, with one UPDATE for all of them"""
+   deltas = {column: delta for column, delta in deltas.items() if delta}
+   if not user_ids or not deltas:
+       return
+  
+   db.session.execute(
+       sa.update(UserStats).where(UserStats.user_id.in_(set(user_ids))).values(
+           {getattr(UserStats, column): getattr(UserStats, column) + delta for column, delta in deltas.items()}
+       ).execution_options(synchronize_session=False)
+   )
+
+
+def rebuild_user_stats():
+   """Replace every counters row with freshly computed values; returns the number of users"""
+   stats = compute_user_stats()
+   UserStats.query.delete()
+   db.session.add_all(UserStats(user_id=user_id, **values) for user_id, values in stats.items())
+   db.session.commit()
+   return len(stats)
+
+
+def order_stats_deltas(order, old_status, new_status):
+   """Per-user counter deltas for moving an order between statuses"""
+   deltas = {}
+   if old_status == new_status:
+       return deltas
+   sign = {'completed': 1}.get(new_status, 0) - {'completed': 1}.get(old_status, 0)
+   pending = {'pending': 1}.get(new_status, 0) - {'pending': 1}.get(old_status, 0)
+  
+   deltas[order.user_id] = {'total_spent': sign * order.total_amount}
+   for item in order.items:
+       farmer = deltas.setdefault(item.farmer_id, {})
+       farmer['total_revenue'] = farmer.get('total_revenue', 0) + sign * item.price * item.quantity
+       farmer['pending_orders'] = pending
+   return deltas
+
+
+def bump_daily_sales(order, sign):
+   """Add (sign=1) or remove (sign=-1) a completed order's items in the sales rollup.
+
+   Rows are keyed on the order's creation day, so reopening an order takes
+   back exactly what completing it added, with one upsert for all its rows.
+   """
+   groups = {}
+   for item in order.items:
+       key = (item.farmer_id, order.created_at.date(), item.animal_type or UNKNOWN_ANIMAL_TYPE)
+       revenue, units = groups.get(key, (0, 0))
+       groups[key] = (revenue + item.price * item.quantity, units + item.quantity)
+   if not groups:
+       return
+  
+   insert = (postgresql if db.engine.dialect.name == 'postgresql' else sqlite).insert(FarmerDailySales)
+   db.session.execute(
+       insert.values([
+           {'farmer_id': farmer_id, 'day': day, 'animal_type': animal_type,
+            'revenue': sign * revenue, 'units': sign * units, 'orders': sign}
+           for (farmer_id, day, animal_type), (revenue, units) in groups.items()
+       ]).on_conflict_do_update(
+           index_elements=['farmer_id', 'day', 'animal_type'],
+           set_={
+               'revenue': FarmerDailySales.revenue + insert.excluded.revenue,
+               'units': FarmerDailySales.units + insert.excluded.units,
+               'orders': FarmerDailySales.orders + insert.excluded.orders
+           }
+       )
+   )
+
+
+def rebuild_daily_sales():
+   """Replace the sales rollup with one computed from completed orders; returns its row count"""
+   if db.engine.dialect.name == 'sqlite':
+       day = db.func.date(Order.created_at)
+   else:
+       day = sa.cast(Order.created_at, sa.Date)
+   animal_type = db.func.coalesce(OrderItem.animal_type, UNKNOWN_ANIMAL_TYPE)
+   FarmerDailySales.query.delete()
+   db.session.execute(sa.insert(FarmerDailySales).from_select(
+       ['farmer_id', 'day', 'animal_type', 'revenue', 'units', 'orders'],
+       db.select(
+           OrderItem.farmer_id, day, animal_type,
+           db.func.sum(OrderItem.price * OrderItem.quantity),
+           db.func.sum(OrderItem.quantity),
+           db.func.count(db.distinct(Order.id))
+       ).join(Order, OrderItem.order_id == Order.id).where(
+           Order.status == 'completed'
+       ).group_by(OrderItem.farmer_id, day, animal_type)
+   ))
+   db.session.commit()
+   return FarmerDailySales.query.count()
+
+
+def period_start(day, interval):
+   """First day of the day, ISO week (Monday) or month containing a date"""
+   if interval == 'week':
+       return day - timedelta(days=day.weekday())
+   if interval == 'month':
+       return day.replace(day=1)
+   return day
+
+
+def next_period(start, interval):
+   if interval == 'week':
+       return start + timedelta(days=7)
+   if interval == 'month':
+       return (start + timedelta(days=32)).replace(day=1)
+   return start + timedelta(days=1)
+
+
+# Bulk import
+IMPORT_CHUNK_SIZE = 500
+IMPORT_MAX_REPORTED_ERRORS = 1000
+IMPORT_REQUIRED_FIELDS = ('name', 'type', 'breed', 'age', 'weight', 'price', 'description')
+IMPORT_NUMERIC_FIELDS = ('age', 'weight', 'price')
+
+
+def read_import_rows(stream, content_type):
+   """Yield (row_number, row dict or error message) from a CSV or NDJSON body without buffering it"""
+   text = io.TextIOWrapper(io.BufferedReader(stream), encoding='utf-8', newline='')
+   if 'csv' in content_type:
+       for row_number, row in enumerate(csv.DictReader(text), start=1):
+           images = row.get('images') or ''
+           row['images'] = [url for url in re.split(r'[|\s]+', images) if url]
+           yield row_number, row
+       return
+  
+   for row_number, line in enumerate(text, start=1):
+       if not line.strip():
+           continue
+       try:
+           row = json.loads(line)
+       except ValueError:
+           yield row_number, 'Invalid JSON'
+           continue
+       yield row_number, row if isinstance(row, dict) else 'Expected a JSON object'
+
+
+def validate_import_row(row, farmer_id, now):
+   """Turn an import row into Animal column values, or return a list of problems"""
+   errors = [f"Missing {field}" for field in IMPORT_REQUIRED_FIELDS if row.get(field) in (None, '')]
+   numbers = {}
+   for field in IMPORT_NUMERIC_FIELDS:
+       if row.get(field) in (None, ''):
+           continue
+       try:
+           numbers[field] = float(row[field])
+       except (TypeError, ValueError):
+           errors.append(f"{field} must be a number")
+           continue
+       if numbers[field] < 0:
+           errors.append(f"{field} must not be negative")
+   # Statuses are labels, not free text, so reject rather than truncate them;
+   # an overlong one would otherwise fail the whole chunk's insert
+   for field in ('healthStatus', 'vaccinationStatus'):
+       value = row.get(field)
+       if value in (None, ''):
+           continue
+       if not isinstance(value, str) or len(value) > 50:
+           errors.append(f"{field} must be text of at most 50 characters")
+   images = row.get('images') or []
+   if not isinstance(images, list) or not all(isinstance(url, str) for url in images):
+       errors.append("images must be a list of URLs")
+   if errors:
+       return None, errors
+  
    return {
-       'id': cart_item.id,
-       'userId': cart_item.user_id,
-       'animalId': cart_item.animal_id,
-       'quantity': cart_item.quantity,
-       'addedAt': cart_item.added_at.isoformat(),
-       'animal': serialize_animal(cart_item.animal)
+       'id': str(uuid.uuid4()),
+       'name': str(row['name'])[:100],
+       'type': str(row['type'])[:50],
+       'breed': str(row['breed'])[:100],
+       'age': numbers['age'],
+       'weight': numbers['weight'],
+       'price': numbers['price'],
+       'description': str(row['description']),
+       'images': images,
+       'health_status': row.get('healthStatus') or 'healthy',
+       'vaccination_status': row.get('vaccinationStatus') or 'up_to_date',
+       'status': 'available',
+       'farmer_id': farmer_id,
+       'created_at': now,
+       'updated_at': now
+   }, None
+
+
+def insert_animal_chunk(rows, farmer_id):
+   """Insert validated rows with one multi-row statement and commit them as a unit"""
+   db.session.execute(sa.insert(Animal), rows)
+   index_animals_search([row['id'] for row in rows])
+   bump_stats(farmer_id, total_animals=len(rows), available_animals=len(rows))
+   db.session.commit()
+
+
+# Streaming export
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def export_value(value, fmt):
+   if isinstance(value, datetime):
+       return value.isoformat()
+   if isinstance(value, list) and fmt == 'csv':
+       # Same separator the CSV importer accepts, so exports can be re-imported
+       return '|'.join(value)
+   return value
+
+
+def stream_export(statement, columns, fmt):
+   """Yield rows from a server-side cursor as NDJSON or CSV, one text chunk per batch"""
+   rows = db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+   buffer = io.StringIO()
+   writer = csv.writer(buffer) if fmt == 'csv' else None
+   if writer:
+       writer.writerow(columns)
+  
+   for count, row in enumerate(rows, start=1):
+       values = [export_value(value, fmt) for value in row]
+       if writer:
+           writer.writerow(values)
+       else:
+           buffer.write(current_app.json.dumps(dict(zip(columns, values))) + '\n')
+       if count % EXPORT_BATCH_SIZE == 0:
+           yield buffer.getvalue()
+           buffer.seek(0)
+           buffer.truncate()
+   yield buffer.getvalue()
+
+
+def export_response(statement, columns, name):
+   fmt = request.args.get('format', 'ndjson')
+   if fmt not in EXPORT_FORMATS:
+       return jsonify({'message': 'format must be ndjson or csv'}), 400
+   filename = f"farmart-{name}-{datetime.utcnow():%Y%m%d}.{fmt}"
+   return Response(
+       stream_with_context(stream_export(statement, columns, fmt)),
+       mimetype=EXPORT_FORMATS[fmt],
+       headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+   )
+
+
+# Image cleanup: stored images are deleted by the outbox worker, never inline
+IMAGE_PUBLIC_ID = re.compile(r'(farmart/animals/[^/?#.]+)')
+
+
+def image_public_id(url):
+   """Storage public id of an image URL we uploaded, or None for external images"""
+   match = IMAGE_PUBLIC_ID.search(url or '')
+   return match.group(1) if match else None
+
+
+def queue_image_deletions(public_ids):
+   """Queue images for deletion; they are removed once the current transaction commits"""
+   public_ids = {public_id for public_id in public_ids if public_id}
+   if not public_ids:
+       return
+   queued = {
+       public_id for (public_id,) in
+       db.session.query(ImageDeletion.public_id).filter(ImageDeletion.public_id.in_(public_ids))
    }
+   for public_id in sorted(public_ids - queued):
+       db.session.add(ImageDeletion(id=str(uuid.uuid4()), public_id=public_id))
+
+
+def referenced_images(user_ids):
+   """Public ids of the stored images the given users' listings and profiles use"""
+   referenced = set()
+   for (images,) in db.session.query(Animal.images).filter(Animal.farmer_id.in_(user_ids)):
+       referenced.update(image_public_id(url) for url in images or [])
+   for (url,) in db.session.query(User.profile_image).filter(User.id.in_(user_ids)):
+       referenced.add(image_public_id(url))
+   return referenced
+
+
+def queue_removed_images(user_id, urls):
+   """Queue deletion of images a farmer removed from a listing.
+
+   Image URLs come from the client, so only images the farmer uploaded through
+   the API (an Upload row they own) are deleted; legacy images with no Upload
+   row are left in storage. Images still used by another of the farmer's
+   listings or their profile are kept. Call after flushing the listing change.
+   """
+   public_ids = {image_public_id(url) for url in urls} - {None}
+   if not public_ids:
+       return
+   owned = Upload.query.filter(
+       Upload.user_id == user_id,
+       Upload.public_id.in_(public_ids),
+       Upload.status.in_(('confirmed', 'attached'))
+   ).all()
+   if not owned:
+       return
+  
+   referenced = referenced_images([user_id])
+   removed = [upload for upload in owned if upload.public_id not in referenced]
+   for upload in removed:
+       upload.status = 'orphaned'
+   queue_image_deletions(upload.public_id for upload in removed)
+
+
+def collect_orphaned_images():
+   """Queue deletion of uploads never attached to a listing; returns how many were queued.
+
+   Uploads are checked once their grace period has passed: confirmed uploads
+   still used by one of the uploader's animals or their profile are marked attached (later
+   removals are queued by queue_removed_images), the rest are orphans.
+   Signed uploads that were never confirmed may still have stored a file, so
+   they are deleted too.
+   """
+   cutoff = datetime.utcnow() - timedelta(hours=current_app.config['IMAGE_ORPHAN_GRACE_HOURS'])
+   candidates = Upload.query.filter(db.or_(
+       db.and_(Upload.status == 'confirmed', Upload.confirmed_at < cutoff),
+       db.and_(Upload.status == 'pending', Upload.expires_at < cutoff)
+   )).all()
+   if not candidates:
+       return 0
+  
+   # Listings and profiles only ever use their own user's uploads
+   referenced = referenced_images({upload.user_id for upload in candidates})
+  
+   orphans = []
+   for upload in candidates:
+       if upload.status == 'confirmed' and upload.public_id in referenced:
+           upload.status = 'attached'
+       else:
+           upload.status = 'orphaned'
+           orphans.append(upload.public_id)
+   queue_image_deletions(orphans)
+   db.session.commit()
+   return len(orphans)
 
 
-def serialize_order(order):
-   return {
-       'id': order.id,
-       'userId': order.user_id,
-       'totalAmount': order.total_amount,
-       'status': order.status,
-       'shippingAddress': order.shipping_address,
-       'paymentMethod': order.payment_method,
-       'paymentStatus': order.payment_status,
-       'notes': order.notes,
-       'createdAt': order.created_at.isoformat(),
-       'updatedAt': order.updated_at.isoformat(),
-       'items': [serialize_order_item(item) for item in order.items]
-   }
+# Inventory: orders in these statuses give their animals back to the catalog
+RELEASED_ORDER_STATUSES = ('rejected', 'cancelled')
 
 
-def serialize_order_item(order_item):
-   return {
-       'id': order_item.id,
-       'animalId': order_item.animal_id,
-       'animalName': order_item.animal_name,
-       'quantity': order_item.quantity,
-       'price': order_item.price,
-       'farmerId': order_item.farmer_id,
-       'farmerName': order_item.farmer_name
-   }
+def reserve_animal(animal_id, user_id):
+   """Hold an animal for a buyer's cart until the reservation TTL runs out.
+
+   Returns False when another buyer holds an unexpired reservation.
+   """
+   now = datetime.utcnow()
+   expires_at = now + timedelta(minutes=current_app.config['RESERVATION_TTL_MINUTES'])
+  
+   # Renew our own hold or take over a lapsed one in a single conditional statement
+   renewed = db.session.execute(
+       sa.update(Reservation).where(
+           Reservation.animal_id == animal_id,
+           db.or_(Reservation.user_id == user_id, Reservation.expires_at < now)
+       ).values(user_id=user_id, expires_at=expires_at).execution_options(synchronize_session=False)
+   ).rowcount
+   if renewed:
+       return True
+  
+   try:
+       with db.session.begin_nested():
+           db.session.add(Reservation(animal_id=animal_id, user_id=user_id, expires_at=expires_at, created_at=now))
+       return True
+   except IntegrityError:
+       return False
+
+
+def reserve_animals(animal_ids, user_id):
+   """Set-based reserve_animal for several animals at once; returns the ids
+   another buyer still holds (empty when every hold was taken)"""
+   animal_ids = list(animal_ids)
+   now = datetime.utcnow()
+   expires_at = now + timedelta(minutes=current_app.config['RESERVATION_TTL_MINUTES'])
+  
+   db.session.execute(
+       sa.update(Reservation).where(
+           Reservation.animal_id.in_(animal_ids),
+           db.or_(Reservation.user_id == user_id, Reservation.expires_at < now)
+       ).values(user_id=user_id, expires_at=expires_at).execution_options(synchronize_session=False)
+   )
+   holders = dict(db.session.execute(
+       db.select(Reservation.animal_id, Reservation.user_id).where(Reservation.animal_id.in_(animal_ids))
+   ).all())
+   unheld = [animal_id for animal_id in animal_ids if animal_id not in holders]
+   if unheld:
+       try:
+           with db.session.begin_nested():
+               db.session.execute(sa.insert(Reservation), [
+                   {'animal_id': animal_id, 'user_id': user_id, 'expires_at': expires_at, 'created_at': now}
+                   for animal_id in unheld
+               ])
+       except IntegrityError:
+           # Another buyer reserved one of them in the meantime
+           return set(unheld)
+   return {animal_id for animal_id, holder in holders.items() if holder != user_id}
+
+
+def release_reservations(user_id, animal_ids):
+   db.session.execute(
+       sa.delete(Reservation).where(
+           Reservation.user_id == user_id,
+           Reservation.animal_id.in_(animal_ids)
+       ).execution_options(synchronize_session=False)
+   )
+
+
+def sweep_expired_reservations():
+   """Delete lapsed cart holds; returns how many were removed"""
+   removed = db.session.execute(
+       sa.delete(Reservation).where(Reservation.expires_at < datetime.utcnow())
+   ).rowcount
+   db.session.commit()
+   return removed
+
+
+def transition_animals(animal_ids, from_status, to_status, buyer_id=None):
+   """Atomically move animals between statuses; returns how many rows moved.
+
+   Only rows still in from_status move, so two checkouts racing for the same
+   animal can never both succeed. With buyer_id, animals held in another
+   buyer's unexpired reservation are skipped too.
+   """
+   conditions = [Animal.id.in_(animal_ids), Animal.status == from_status]
+   if buyer_id is not None:
+       conditions.append(~db.select(Reservation.animal_id).where(
+           Reservation.animal_id == Animal.id,
+           Reservation.user_id != buyer_id,
+           Reservation.expires_at >= datetime.utcnow()
+       ).exists())
+   return db.session.execute(
+       sa.update(Animal).where(*conditions).values(
+           status=to_status, updated_at=datetime.utcnow()
+       ).execution_options(synchronize_session=False)
+   ).rowcount
+
+
+def bump_inventory_stats(farmer_counts, from_status, to_status):
+   """Move farmer animal counters between statuses; farmer_counts maps farmer id to animal count"""
+   by_count = {}
+   for farmer_id, count in farmer_counts.items():
+       by_count.setdefault(count, []).append(farmer_id)
+   for count, farmer_ids in by_count.items():
+       deltas = {}
+       if from_status in ('available', 'sold'):
+           deltas[f'{from_status}_animals'] = -count
+       if to_status in ('available', 'sold'):
+           deltas[f'{to_status}_animals'] = count
+       bump_stats_many(farmer_ids, **deltas)
+
+
+def encode_cursor(*values):
+   """Build an opaque keyset cursor from the sort key of the last row on a page"""
+   payload = json.dumps(values)
+   return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+   """Return the sort key values encoded in a cursor, or None if it is malformed"""
+   try:
+       padded = cursor + '=' * (-len(cursor) % 4)
+       values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+   except ValueError:
+       return None
+   return values if isinstance(values, list) and len(values) == 2 else None
+
+
+def set_next_page(response, next_cursor, limit):
+   """Point a paginated response at its next page via X-Next-Cursor and a Link header"""
+   args = request.args.to_dict()
+   args.update(cursor=next_cursor, limit=limit)
+   next_url = f"{request.base_url}?{urlencode(args)}"
+   response.headers['X-Next-Cursor'] = next_cursor
+   response.headers['Link'] = f'<{next_url}>; rel="next"'
+
+
+def parse_date_range():
+   """Read the from/to query parameters as a [start, end) datetime range.
+
+   Either may be a date or a datetime; a bare 'to' date includes that whole day.
+   Raises ValueError when one is malformed.
+   """
+   start = end = None
+   if request.args.get('from'):
+       start = datetime.fromisoformat(request.args['from'])
+   if request.args.get('to'):
+       end = datetime.fromisoformat(request.args['to'])
+       if 'T' not in request.args['to'] and ' ' not in request.args['to']:
+           end += timedelta(days=1)
+   return start, end
+
+
+def search_terms(search):
+   """Split free text into word tokens safe to embed in a full-text query"""
+   return re.findall(r'\w+', search.lower())
+
+
+def index_animal_search(animal):
+   """Refresh the full-text index entry for an animal (call after flush)"""
+   index_animals_search([animal.id])
+
+
+def index_animals_search(animal_ids):
+   """Refresh the full-text index entries for already-flushed animals in one statement each"""
+   if not animal_ids:
+       return
+   dialect = db.engine.dialect.name
+   if dialect == 'postgresql':
+       db.session.execute(
+           sa.text(f"UPDATE animals SET search_vector = {SEARCH_VECTOR_SQL} WHERE id IN :ids").bindparams(
+               sa.bindparam('ids', expanding=True)
+           ),
+           {'ids': list(animal_ids)}
+       )
+   elif dialect == 'sqlite':
+       db.session.execute(animals_fts.delete().where(animals_fts.c.animal_id.in_(animal_ids)))
+       db.session.execute(animals_fts.insert().from_select(
+           ['animal_id', 'name', 'type', 'breed', 'description'],
+           db.select(Animal.id, Animal.name, Animal.type, Animal.breed, Animal.description).where(
+               Animal.id.in_(animal_ids)
+           )
+       ))
+
+
+def unindex_animal_search(animal_id):
+   """Drop an animal from the full-text index (PostgreSQL rows carry their own vector)"""
+   if db.engine.dialect.name == 'sqlite':
+       db.session.execute(animals_fts.delete().where(animals_fts.c.animal_id == animal_id))
+
+
+def apply_search(query, search):
+   """Filter a query by full-text search, returning (query, rank expression or None)"""
+   terms = search_terms(search)
+   if not terms:
+       return query, None
+  
+   dialect = db.engine.dialect.name
+   if dialect == 'postgresql':
+       tsquery = db.func.to_tsquery('english', ' & '.join(f'{term}:*' for term in terms))
+       search_vector = sa.literal_column('animals.search_vector')
+       # ts_rank returns float4; widen it so the rank a cursor carries round-trips
+       # exactly through a Python float and the keyset comparison stays exact
+       rank = sa.cast(db.func.ts_rank(search_vector, tsquery), sa.Double)
+       return query.filter(search_vector.op('@@')(tsquery)), rank
+   if dialect == 'sqlite':
+       # bm25() scores better matches lower, so negate it to sort descending
+       matches = db.select(
+           animals_fts.c.animal_id,
+           (-db.func.bm25(sa.literal_column('animals_fts'))).label('rank')
+       ).where(
+           sa.literal_column('animals_fts').op('MATCH')(' '.join(f'"{term}"*' for term in terms))
+       ).subquery()
+       return query.join(matches, matches.c.animal_id == Animal.id), matches.c.rank
+  
+   # No full-text index on other backends; fall back to substring matching
+   return query.filter(
+       db.or_(
+           Animal.name.ilike(f'%{search}%'),
+           Animal.type.ilike(f'%{search}%'),
+           Animal.breed.ilike(f'%{search}%'),
+           Animal.description.ilike(f'%{search}%')
+       )
+   ), None
+
+
+def geocode_user(user):
+   """Set a user's coordinates and grid cell from their free-text location"""
+   point = get_gazetteer().geocode(user.location)
+   user.latitude, user.longitude = point or (None, None)
+   user.geo_cell = geo.grid_cell(*point) if point else None
+
+
+def apply_near(query, latitude, longitude, radius_km):
+   """Restrict a query joined to the farmer to farms within radius_km of a point,
+   returning (query, squared distance expression in km²)"""
+   min_lat, max_lat, min_lon, max_lon = geo.bounding_box(latitude, longitude, radius_km)
+   cells = geo.cells_in_box(min_lat, max_lat, min_lon, max_lon)
+   if cells is not None:
+       query = query.filter(User.geo_cell.in_(cells))
+   query = query.filter(User.latitude.between(min_lat, max_lat), User.longitude.between(min_lon, max_lon))
+  
+   # Equirectangular approximation: plain arithmetic, so it runs on every database
+   scale = math.cos(math.radians(latitude))
+   dy = (User.latitude - latitude) * geo.KM_PER_DEGREE
+   dx = (User.longitude - longitude) * (geo.KM_PER_DEGREE * scale)
+   distance_squared = dx * dx + dy * dy
+   return query.filter(distance_squared <= radius_km * radius_km), distance_squared
+
+
+def filter_animals(query):
+   """Apply the catalog filters in the query string to an Animal query,
+   returning (query, search rank expression or None, squared distance
+   expression or None)"""
+   animal_type = request.args.get('type', '')
+   breed = request.args.get('breed', '')
+   min_age = request.args.get('minAge', type=float)
+   max_age = request.args.get('maxAge', type=float)
+   min_price = request.args.get('minPrice', type=float)
+   max_price = request.args.get('maxPrice', type=float)
+   search = request.args.get('search', '')
+   location = request.args.get('location', '')
+   farmer_id = request.args.get('farmerId', '')
+   near = request.args.get('near', '')
+   latitude = request.args.get('lat', type=float)
+   longitude = request.args.get('lng', type=float)
+   radius_km = request.args.get('radius', DEFAULT_RADIUS_KM, type=float)
+  
+   query = query.filter(Animal.status == 'available')
+   if farmer_id:
+       query = query.filter(Animal.farmer_id == farmer_id)
+   if animal_type:
+       query = query.filter(Animal.type.ilike(f'%{animal_type}%'))
+   if breed:
+       query = query.filter(Animal.breed.ilike(f'%{breed}%'))
+   if min_age:
+       query = query.filter(Animal.age >= min_age)
+   if max_age:
+       query = query.filter(Animal.age <= max_age)
+   if min_price:
+       query = query.filter(Animal.price >= min_price)
+   if max_price:
+       query = query.filter(Animal.price <= max_price)
+   # The buyer's position: explicit coordinates, or a place name to geocode
+   point = (latitude, longitude) if latitude is not None and longitude is not None else None
+   if point is None and near:
+       point = get_gazetteer().geocode(near)
+       if point is None:
+           raise NearLocationError(near)
+   if location or point:
+       query = query.join(User, Animal.farmer_id == User.id)
+   if location:
+       query = query.filter(User.location.ilike(f'%{location}%'))
+   distance = None
+   if point:
+       query, distance = apply_near(query, *point, min(max(radius_km, 1), MAX_RADIUS_KM))
+   query, rank = apply_search(query, search)
+   return query, rank, distance
+
+
+class NearLocationError(ValueError):
+   """The 'near' place name is not in the gazetteer"""
+
+
+# Facet bands as (min, max) pairs; min is inclusive, max exclusive, None is open-ended
+PRICE_BANDS = ((0, 100), (100, 500), (500, 1000), (1000, 2500), (2500, 5000), (5000, None))
+AGE_BANDS = ((0, 1), (1, 2), (2, 5), (5, 10), (10, None))
+
+
+def band_index(column, bands):
+   """SQL expression giving the position of column's value in bands"""
+   return db.case(
+       *[(column < upper, index) for index, (lower, upper) in enumerate(bands) if upper is not None],
+       else_=len(bands) - 1
+   )
+
+
+def serialize_bands(bands, counts):
+   return [
+       {'min': lower, 'max': upper, 'count': counts.get(index, 0)}
+       for index, (lower, upper) in enumerate(bands)
+   ]
+
+
+# Serializers are compiled once; the serialize_* helpers take an optional
+# tuple of ?fields= paths (see requested_fields) to emit a sparse fieldset
+user_serializer = Serializer({
+   'id': attr('id'),
+   'email': attr('email'),
+   'name': attr('name'),
+   'userType': attr('user_type'),
+   'phone': attr('phone'),
+   'location': attr('location'),
+   'profileImage': attr('profile_image'),
+   'isVerified': attr('is_verified'),
+   'createdAt': isoformat('created_at')
+})
+
+animal_serializer = Serializer({
+   'id': attr('id'),
+   'name': attr('name'),
+   'type': attr('type'),
+   'breed': attr('breed'),
+   'age': attr('age'),
+   'weight': attr('weight'),
+   'price': attr('price'),
+   'description': attr('description'),
+   'images': attr('images'),
+   'healthStatus': attr('health_status'),
+   'vaccinationStatus': attr('vaccination_status'),
+   'status': attr('status'),
+   'farmerId': attr('farmer_id'),
+   'farmerName': attr('farmer.name'),
+   'farmerLocation': attr('farmer.location'),
+   'farmerPhone': attr('farmer.phone'),
+   'createdAt': isoformat('created_at'),
+   'updatedAt': isoformat('updated_at')
+})
+
+cart_item_serializer = Serializer({
+   'id': attr('id'),
+   'userId': attr('user_id'),
+   'animalId': attr('animal_id'),
+   'quantity': attr('quantity'),
+   'addedAt': isoformat('added_at'),
+   'animal': Nested('animal', animal_serializer)
+})
+
+order_item_serializer = Serializer({
+   'id': attr('id'),
+   'animalId': attr('animal_id'),
+   'animalName': attr('animal_name'),
+   'animalType': attr('animal_type'),
+   'quantity': attr('quantity'),
+   'price': attr('price'),
+   'farmerId': attr('farmer_id'),
+   'farmerName': attr('farmer_name')
+})
+
+order_serializer = Serializer({
+   'id': attr('id'),
+   'userId': attr('user_id'),
+   'totalAmount': attr('total_amount'),
+   'status': attr('status'),
+   'shippingAddress': attr('shipping_address'),
+   'paymentMethod': attr('payment_method'),
+   'paymentStatus': attr('payment_status'),
+   'notes': attr('notes'),
+   'createdAt': isoformat('created_at'),
+   'updatedAt': isoformat('updated_at'),
+   'items': Nested('items', order_item_serializer, many=True)
+})
+
+
+def requested_fields():
+   """The ?fields= selection as a tuple of dotted paths, or None for every field"""
+   return parse_fields(request.args.get('fields'))
+
+
+def serialize_user(user, fields=None):
+   return user_serializer(user, fields)
+
+
+def serialize_animal(animal, fields=None):
+   return animal_serializer(animal, fields)
+
+
+def serialize_cart_item(cart_item, fields=None):
+   return cart_item_serializer(cart_item, fields)
+
+
+def serialize_order(order, fields=None):
+   return order_serializer(order, fields)
+
+
+def serialize_order_item(order_item, fields=None):
+   return order_item_serializer(order_item, fields)
 
 
 # Routes
-@app.route('/')
+@api.route('/')
 def index():
    return 'Farmart API is running'
 
 
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+   """Prometheus scrape endpoint; requires 'Bearer <METRICS_TOKEN>' when that is set"""
+   token = current_app.config['METRICS_TOKEN']
+   if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+       return jsonify({'message': 'Unauthorized'}), 401
+   return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+
 # Auth Routes
-@app.route('/api/auth/register', methods=['POST'])
+@api.route('/api/auth/register', methods=['POST'])
 def register():
    try:
        data = request.get_json()
@@ -257,17 +1583,22 @@ def register():
            location=data['location']
        )
       
+       geocode_user(user)
        db.session.add(user)
-       db.session.commit()
+       db.session.add(UserStats(user_id=user.id, **dict.fromkeys(STATS_COLUMNS, 0)))
       
-       # Send welcome email
+       # Queue welcome email
        welcome_html = f"""
        <h2>Welcome to Farmart, {user.name}!</h2>
        <p>Thank you for joining our agricultural marketplace.</p>
        <p>You have registered as a <strong>{user.user_type}</strong>.</p>
        <p>Start exploring quality livestock and connect directly with {'buyers' if user.user_type == 'farmer' else 'farmers'}!</p>
        """
-       send_email(user.email, "Welcome to Farmart!", welcome_html)
+       queue_email(user.email, "Welcome to Farmart!", welcome_html)
+      
+       db.session.commit()
+       # The request carried no token for remember_writer to see
+       g.writer_id = user.id
       
        # Create access token
        access_token = create_access_token(identity=user.id)
@@ -279,11 +1610,10 @@ def register():
        }), 201
       
    except Exception as e:
-    print(f"Registration Error: {e}")  # Add this line
-    return jsonify({'message': 'Server error'}), 500
+       return server_error(e)
 
 
-@app.route('/api/auth/login', methods=['POST'])
+@api.route('/api/auth/login', methods=['POST'])
 def login():
    try:
        data = request.get_json()
@@ -303,11 +1633,11 @@ def login():
        })
       
    except Exception as e:
-       return jsonify({'message': 'Server error'}), 500
+       return server_error(e)
 
 
 # Image upload route
-@app.route('/api/upload-image', methods=['POST'])
+@api.route('/api/upload-image', methods=['POST'])
 @jwt_required()
 def upload_image():
    try:
@@ -319,15 +1649,31 @@ def upload_image():
            return jsonify({'message': 'No image file selected'}), 400
       
        # Upload to Cloudinary
-       result = cloudinary.uploader.upload(
-           file,
-           folder="farmart/animals",
-           transformation=[
-               {'width': 800, 'height': 600, 'crop': 'fill'},
-               {'quality': 'auto'},
-               {'fetch_format': 'auto'}
-           ]
-       )
+       with external_call('cloudinary', 'upload'):
+           result = get_cloudinary_uploader().upload(
+               file,
+               timeout=current_app.config['CLOUDINARY_TIMEOUT'],
+               folder="farmart/animals",
+               transformation=[
+                   {'width': 800, 'height': 600, 'crop': 'fill'},
+                   {'quality': 'auto'},
+                   {'fetch_format': 'auto'}
+               ]
+           )
+      
+       # Record it like a confirmed direct upload, so removing it from a listing
+       # deletes it and garbage collection catches it if it is never used
+       now = datetime.utcnow()
+       db.session.add(Upload(
+           id=str(uuid.uuid4()),
+           user_id=get_jwt_identity(),
+           public_id=result['public_id'],
+           url=result['secure_url'],
+           status='confirmed',
+           expires_at=now,
+           confirmed_at=now
+       ))
+       db.session.commit()
       
        return jsonify({
            'message': 'Image uploaded successfully',
@@ -335,64 +1681,205 @@ def upload_image():
            'publicId': result['public_id']
        })
       
+   except ServiceUnavailableError:
+       return jsonify({'message': 'Image uploads are temporarily unavailable, please try again shortly'}), 503
+   except Exception as e:
+       return server_error(e, 'Image upload failed')
+
+# Direct upload routes: the client uploads straight to storage with a
+# short-lived signature, then confirms so the API can record the URL
+@api.route('/api/uploads/sign', methods=['POST'])
+@jwt_required()
+def sign_upload():
+   try:
+       user_id = get_jwt_identity()
+       expires_in = current_app.config['UPLOAD_SIGNATURE_TTL']
+       upload = Upload(
+           id=str(uuid.uuid4()),
+           user_id=user_id,
+           public_id=f"farmart/animals/{uuid.uuid4().hex}",
+           expires_at=datetime.utcnow() + timedelta(seconds=expires_in)
+       )
+       upload_url, fields = get_storage().sign_upload(upload.public_id, expires_in)
+      
+       db.session.add(upload)
+       db.session.commit()
+      
+       return jsonify({
+           'uploadId': upload.id,
+           'uploadUrl': upload_url,
+           'fields': fields,
+           'expiresAt': upload.expires_at.isoformat()
+       }), 201
+      
+   except Exception as e:
+       return server_error(e)
+
+
+@api.route('/api/uploads/<upload_id>/confirm', methods=['POST'])
+@jwt_required()
+def confirm_upload(upload_id):
+   try:
+       user_id = get_jwt_identity()
+       upload = Upload.query.filter_by(id=upload_id, user_id=user_id).first()
+       if not upload:
+           return jsonify({'message': 'Upload not found'}), 404
+      
+       if upload.status == 'pending':
+           try:
+               upload.url = get_storage().confirm_upload(upload.public_id, request.get_json() or {})
+           except UploadVerificationError as e:
+               return jsonify({'message': str(e)}), 400
+           upload.status = 'confirmed'
+           upload.confirmed_at = datetime.utcnow()
+           db.session.commit()
+      
+       return jsonify({
+           'message': 'Image uploaded successfully',
+           'imageUrl': upload.url,
+           'publicId': upload.public_id
+       })
+      
    except Exception as e:
-        print(f"Upload error: {e}")  # Add this line to see the real issue
-        return jsonify({'message': 'Image upload failed'}), 500
+       return server_error(e)
+
+
+# Local storage stand-in, active only when STORAGE_BACKEND is 'local'
+@api.route('/api/storage/local/upload', methods=['POST'])
+def local_storage_upload():
+   if current_app.config['STORAGE_BACKEND'] != 'local':
+       return jsonify({'message': 'Not found'}), 404
+   if 'file' not in request.files:
+       return jsonify({'message': 'No image file provided'}), 400
+   try:
+       return jsonify(get_storage().accept_upload(request.form, request.files['file']))
+   except (UploadVerificationError, ValueError) as e:
+       return jsonify({'message': str(e)}), 400
+
+
+@api.route('/api/storage/local/<path:public_id>', methods=['GET'])
+def local_storage_file(public_id):
+   if current_app.config['STORAGE_BACKEND'] != 'local':
+       return jsonify({'message': 'Not found'}), 404
+   return send_from_directory(current_app.config['LOCAL_STORAGE_ROOT'], public_id)
+
 
 # Animal Routes
-@app.route('/api/animals', methods=['GET'])
+@api.route('/api/animals', methods=['GET'])
+@cached_listing
+@replica_read
 def get_animals():
    try:
-       # Get query parameters for filtering
-       animal_type = request.args.get('type', '')
-       breed = request.args.get('breed', '')
-       min_age = request.args.get('minAge', type=float)
-       max_age = request.args.get('maxAge', type=float)
-       min_price = request.args.get('minPrice', type=float)
-       max_price = request.args.get('maxPrice', type=float)
-       search = request.args.get('search', '')
-       location = request.args.get('location', '')
-      
-       # Build query
-       query = Animal.query.filter_by(status='available')
-      
-       if animal_type:
-           query = query.filter(Animal.type.ilike(f'%{animal_type}%'))
-       if breed:
-           query = query.filter(Animal.breed.ilike(f'%{breed}%'))
-       if min_age:
-           query = query.filter(Animal.age >= min_age)
-       if max_age:
-           query = query.filter(Animal.age <= max_age)
-       if min_price:
-           query = query.filter(Animal.price >= min_price)
-       if max_price:
-           query = query.filter(Animal.price <= max_price)
-       if search:
-           query = query.filter(
-               db.or_(
-                   Animal.name.ilike(f'%{search}%'),
-                   Animal.type.ilike(f'%{search}%'),
-                   Animal.breed.ilike(f'%{search}%'),
-                   Animal.description.ilike(f'%{search}%')
-               )
+       # distanceKm is computed per query rather than by the serializer
+       fields = requested_fields()
+       with_distance = fields is None or 'distanceKm' in fields
+       try:
+           serialize = animal_serializer.plan(
+               fields and tuple(field for field in fields if field != 'distanceKm')
            )
-       if location:
-           query = query.join(User).filter(User.location.ilike(f'%{location}%'))
+           query, rank, distance = filter_animals(Animal.query.options(*animal_loader()))
+       except UnknownFieldError as e:
+           return jsonify({'message': str(e)}), 400
+       except NearLocationError:
+           return jsonify({'message': 'Unknown location'}), 400
+      
+       # Keyset pagination: nearest first when asked, by relevance for searches,
+       # newest first otherwise, always tie-broken on id so every page costs the same.
+       # Nearest-first sorts descending on the negated distance like the other keys.
+       if distance is not None and request.args.get('sort') == 'distance':
+           score = -distance
+       else:
+           score = rank
+       sort_key = (score, Animal.id) if score is not None else (Animal.created_at, Animal.id)
+       limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+       limit = max(1, min(limit, MAX_PAGE_SIZE))
+       cursor = request.args.get('cursor', '')
+       if cursor:
+           position = decode_cursor(cursor)
+           try:
+               position[0] = float(position[0]) if score is not None else datetime.fromisoformat(position[0])
+           except (TypeError, ValueError):
+               return jsonify({'message': 'Invalid cursor'}), 400
+           query = query.filter(db.tuple_(*sort_key) < tuple(position))
+      
+       extra_columns = [column for column in (score, distance) if column is not None]
+       if extra_columns:
+           query = query.add_columns(*extra_columns)
+       rows = query.order_by(*[key.desc() for key in sort_key]).limit(limit + 1).all()
+       has_more = len(rows) > limit
+       rows = rows[:limit]
+       animals = [row[0] for row in rows] if extra_columns else rows
+      
+       results = [serialize(animal) for animal in animals]
+       if distance is not None and with_distance:
+           for result, row in zip(results, rows):
+               result['distanceKm'] = round(math.sqrt(row[-1]), 1)
+       response = jsonify(results)
+       if animals:
+           response.last_modified = max(animal.updated_at for animal in animals)
+       if has_more:
+           if score is not None:
+               next_cursor = encode_cursor(rows[-1][1], animals[-1].id)
+           else:
+               next_cursor = encode_cursor(animals[-1].created_at.isoformat(), animals[-1].id)
+           set_next_page(response, next_cursor, limit)
+       return response
       
-       animals = query.order_by(Animal.created_at.desc()).all()
-       return jsonify([serialize_animal(animal) for animal in animals])
+   except Exception as e:
+       return server_error(e)
+
+
+@api.route('/api/animals/facets', methods=['GET'])
+@cached_listing
+@replica_read
+def get_animal_facets():
+   """Counts of available animals per type, breed, price band and age band
+   under the same filters as get_animals"""
+   try:
+       price_band = band_index(Animal.price, PRICE_BANDS).label('price_band')
+       age_band = band_index(Animal.age, AGE_BANDS).label('age_band')
+       query = db.session.query(Animal.type, Animal.breed, price_band, age_band, db.func.count(Animal.id))
+       try:
+           query, _, _ = filter_animals(query.select_from(Animal))
+       except NearLocationError:
+           return jsonify({'message': 'Unknown location'}), 400
+      
+       # One grouped query over every facet combination, folded into per-facet counts here
+       total = 0
+       types, breeds, prices, ages = {}, {}, {}, {}
+       for animal_type, breed, price_index, age_index, count in query.group_by(
+           Animal.type, Animal.breed, price_band, age_band
+       ):
+           total += count
+           types[animal_type] = types.get(animal_type, 0) + count
+           breeds[breed] = breeds.get(breed, 0) + count
+           prices[price_index] = prices.get(price_index, 0) + count
+           ages[age_index] = ages.get(age_index, 0) + count
+      
+       def ranked(counts):
+           return [
+               {'value': value, 'count': count}
+               for value, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+           ]
+      
+       return jsonify({
+           'total': total,
+           'types': ranked(types),
+           'breeds': ranked(breeds),
+           'priceBands': serialize_bands(PRICE_BANDS, prices),
+           'ageBands': serialize_bands(AGE_BANDS, ages)
+       })
       
    except Exception as e:
-       return jsonify({'message': 'Server error'}), 500
+       return server_error(e)
 
 
-@app.route('/api/animals', methods=['POST'])
+@api.route('/api/animals', methods=['POST'])
 @jwt_required()
 def add_animal():
    try:
        user_id = get_jwt_identity()
-       user = User.query.get(user_id)
+       user = current_user
       
        if user.user_type != 'farmer':
            return jsonify({'message': 'Only farmers can add animals'}), 403
@@ -415,7 +1902,11 @@ def add_animal():
        )
       
        db.session.add(animal)
+       db.session.flush()
+       index_animal_search(animal)
+       bump_stats(user_id, total_animals=1, available_animals=1)
        db.session.commit()
+       listing_cache.clear()
       
        # Send notification email to admin (optional)
        admin_html = f"""
@@ -424,28 +1915,90 @@ def add_animal():
        <p><strong>Animal:</strong> {animal.name} ({animal.type})</p>
        <p><strong>Price:</strong> ${animal.price}</p>
        """
-       # send_email('admin@farmart.com', 'New Animal Listed', admin_html)
+       # queue_email('admin@farmart.com', 'New Animal Listed', admin_html)
       
        return jsonify(serialize_animal(animal)), 201
       
    except Exception as e:
-       return jsonify({'message': 'Server error'}), 500
+       return server_error(e)
 
 
-@app.route('/api/animals/<animal_id>', methods=['GET'])
+@api.route('/api/animals/import', methods=['POST'])
+@jwt_required()
+def import_animals():
+   try:
+       user_id = get_jwt_identity()
+       user = current_user
+      
+       if user.user_type != 'farmer':
+           return jsonify({'message': 'Only farmers can add animals'}), 403
+      
+       content_type = request.mimetype or ''
+       if 'csv' not in content_type and 'ndjson' not in content_type and 'jsonl' not in content_type:
+           return jsonify({'message': 'Send text/csv or application/x-ndjson'}), 415
+      
+       imported = 0
+       failed = 0
+       errors = []
+       chunk = []
+       for row_number, row in read_import_rows(request.stream, content_type):
+           values, problems = (None, [row]) if isinstance(row, str) else validate_import_row(row, user_id, datetime.utcnow())
+           if problems:
+               failed += 1
+               if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+                   errors.append({'row': row_number, 'errors': problems})
+               continue
+          
+           chunk.append(values)
+           if len(chunk) >= IMPORT_CHUNK_SIZE:
+               insert_animal_chunk(chunk, user_id)
+               imported += len(chunk)
+               chunk = []
+      
+       if chunk:
+           insert_animal_chunk(chunk, user_id)
+           imported += len(chunk)
+      
+       if imported:
+           listing_cache.clear()
+      
+       return jsonify({
+           'message': f'Imported {imported} animals',
+           'imported': imported,
+           'failed': failed,
+           'errors': errors
+       })
+      
+   except UnicodeDecodeError:
+       db.session.rollback()
+       return jsonify({'message': 'Import file must be UTF-8'}), 400
+   except Exception as e:
+       db.session.rollback()
+       return server_error(e)
+
+
+@api.route('/api/animals/<animal_id>', methods=['GET'])
+@cached_listing
+@replica_read
 def get_animal(animal_id):
    try:
-       animal = Animal.query.get(animal_id)
+       try:
+           serialize = animal_serializer.plan(requested_fields())
+       except UnknownFieldError as e:
+           return jsonify({'message': str(e)}), 400
+       animal = Animal.query.options(*animal_loader()).filter_by(id=animal_id).first()
        if not animal:
            return jsonify({'message': 'Animal not found'}), 404
       
-       return jsonify(serialize_animal(animal))
+       response = jsonify(serialize(animal))
+       response.last_modified = animal.updated_at
+       return response
       
    except Exception as e:
-       return jsonify({'message': 'Server error'}), 500
+       return server_error(e)
 
 
-@app.route('/api/animals/<animal_id>', methods=['PUT'])
+@api.route('/api/animals/<animal_id>', methods=['PUT'])
 @jwt_required()
 def update_animal(animal_id):
    try:
@@ -456,6 +2009,7 @@ def update_animal(animal_id):
            return jsonify({'message': 'Animal not found or unauthorized'}), 404
       
        data = request.get_json()
+       previous_images = animal.images or []
       
        animal.name = data.get('name', animal.name)
        animal.type = data.get('type', animal.type)
@@ -469,15 +2023,19 @@ def update_animal(animal_id):
        animal.vaccination_status = data.get('vaccinationStatus', animal.vaccination_status)
        animal.updated_at = datetime.utcnow()
       
+       db.session.flush()
+       queue_removed_images(user_id, set(previous_images) - set(animal.images or []))
+       index_animal_search(animal)
        db.session.commit()
+       listing_cache.clear()
       
        return jsonify(serialize_animal(animal))
       
    except Exception as e:
-       return jsonify({'message': 'Server error'}), 500
+       return server_error(e)
 
 
-@app.route('/api/animals/<animal_id>', methods=['DELETE'])
+@api.route('/api/animals/<animal_id>', methods=['DELETE'])
 @jwt_required()
 def delete_animal(animal_id):
    try:
@@ -487,39 +2045,45 @@ def delete_animal(animal_id):
        if not animal:
            return jsonify({'message': 'Animal not found or unauthorized'}), 404
       
-       # Delete images from Cloudinary
-       for image_url in animal.images:
-           try:
-               # Extract public_id from URL and delete
-               public_id = image_url.split('/')[-1].split('.')[0]
-               cloudinary.uploader.destroy(f"farmart/animals/{public_id}")
-           except:
-               pass
-      
+       unindex_animal_search(animal.id)
        db.session.delete(animal)
+       db.session.flush()
+       # Images are removed from storage by the outbox worker after commit
+       queue_removed_images(user_id, animal.images or [])
+       bump_stats(
+           user_id,
+           total_animals=-1,
+           available_animals=-1 if animal.status == 'available' else 0,
+           sold_animals=-1 if animal.status == 'sold' else 0
+       )
        db.session.commit()
+       listing_cache.clear()
       
        return jsonify({'message': 'Animal deleted successfully'})
       
    except Exception as e:
-       return jsonify({'message': 'Server error'}), 500
+       return server_error(e)
 
 
 # Cart Routes
-@app.route('/api/cart', methods=['GET'])
+@api.route('/api/cart', methods=['GET'])
 @jwt_required()
 def get_cart():
    try:
+       try:
+           serialize = cart_item_serializer.plan(requested_fields())
+       except UnknownFieldError as e:
+           return jsonify({'message': str(e)}), 400
        user_id = get_jwt_identity()
-       cart_items = CartItem.query.filter_by(user_id=user_id).all()
+       cart_items = CartItem.query.options(*cart_item_loader()).filter_by(user_id=user_id).all()
       
-       return jsonify([serialize_cart_item(item) for item in cart_items])
+       return jsonify([serialize(item) for item in cart_items])
       
    except Exception as e:
-       return jsonify({'message': 'Server error'}), 500
+       return server_error(e)
 
 
-@app.route('/api/cart', methods=['POST'])
+@api.route('/api/cart', methods=['POST'])
 @jwt_required()
 def add_to_cart():
    try:
@@ -533,6 +2097,10 @@ def add_to_cart():
        if animal.status != 'available':
            return jsonify({'message': 'Animal is not available'}), 400
       
+       if not reserve_animal(animal.id, user_id):
+           db.session.rollback()
+           return jsonify({'message': 'Animal is reserved by another buyer'}), 409
+      
        # Check if item already exists in cart
        existing_item = CartItem.query.filter_by(
            user_id=user_id,
@@ -550,15 +2118,26 @@ def add_to_cart():
            )
            db.session.add(cart_item)
       
-       db.session.commit()
+       try:
+           if not existing_item:
+               bump_stats(user_id, cart_items=1)
+           db.session.commit()
+       except IntegrityError:
+           # A concurrent request added the same animal first; fold into its row
+           db.session.rollback()
+           reserve_animal(animal.id, user_id)
+           CartItem.query.filter_by(user_id=user_id, animal_id=data['animalId']).update(
+               {CartItem.quantity: CartItem.quantity + data.get('quantity', 1)}
+           )
+           db.session.commit()
       
        return jsonify({'message': 'Item added to cart'})
       
    except Exception as e:
-       return jsonify({'message': 'Server error'}), 500
+       return server_error(e)
 
 
-@app.route('/api/cart/<item_id>', methods=['PUT'])
+@api.route('/api/cart/<item_id>', methods=['PUT'])
 @jwt_required()
 def update_cart_item(item_id):
    try:
@@ -576,10 +2155,10 @@ def update_cart_item(item_id):
        return jsonify({'message': 'Cart item updated'})
       
    except Exception as e:
-       return jsonify({'message': 'Server error'}), 500
+       return server_error(e)
 
 
-@app.route('/api/cart/<item_id>', methods=['DELETE'])
+@api.route('/api/cart/<item_id>', methods=['DELETE'])
 @jwt_required()
 def remove_from_cart(item_id):
    try:
@@ -590,60 +2169,213 @@ def remove_from_cart(item_id):
            return jsonify({'message': 'Cart item not found'}), 404
       
        db.session.delete(cart_item)
+       db.session.flush()
+       release_reservations(user_id, [cart_item.animal_id])
+       bump_stats(user_id, cart_items=-1)
        db.session.commit()
       
        return jsonify({'message': 'Item removed from cart'})
       
    except Exception as e:
-       return jsonify({'message': 'Server error'}), 500
+       return server_error(e)
+
+
+@api.route('/api/cart/batch', methods=['POST'])
+@jwt_required()
+def batch_update_cart():
+   """Apply a list of add/update/remove operations in one transaction and return the cart.
+
+   Operations are folded into the net change per animal first, so the writes
+   are a fixed handful of set-based statements however many operations are sent.
+   """
+   try:
+       try:
+           serialize = cart_item_serializer.plan(requested_fields())
+       except UnknownFieldError as e:
+           return jsonify({'message': str(e)}), 400
+       user_id = get_jwt_identity()
+       operations = (request.get_json() or {}).get('operations')
+       if not isinstance(operations, list) or not operations:
+           return jsonify({'message': 'operations must be a non-empty list'}), 400
+       if len(operations) > MAX_CART_BATCH_SIZE:
+           return jsonify({'message': f'At most {MAX_CART_BATCH_SIZE} operations per batch'}), 400
+      
+       rows = db.session.execute(
+           db.select(CartItem.id, CartItem.animal_id, CartItem.quantity).where(CartItem.user_id == user_id)
+       ).all()
+       current = {animal_id: quantity for item_id, animal_id, quantity in rows}
+       item_animals = {item_id: animal_id for item_id, animal_id, quantity in rows}
+      
+       cart = dict(current)
+       added = set()
+       for index, op in enumerate(operations):
+           if not isinstance(op, dict) or op.get('op') not in ('add', 'update', 'remove'):
+               return jsonify({'message': f"Operation {index}: op must be 'add', 'update' or 'remove'"}), 400
+           if any(not isinstance(op.get(key), (str, type(None))) for key in ('animalId', 'itemId')):
+               return jsonify({'message': f'Operation {index}: animalId and itemId must be strings'}), 400
+           animal_id = op.get('animalId') or item_animals.get(op.get('itemId'))
+           quantity = op.get('quantity', 1)
+           if not animal_id:
+               return jsonify({'message': f'Operation {index}: cart item not found'}), 404
+           if op['op'] != 'remove' and (not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1):
+               return jsonify({'message': f'Operation {index}: quantity must be a positive integer'}), 400
+           if op['op'] != 'add' and animal_id not in cart:
+               return jsonify({'message': f'Operation {index}: cart item not found'}), 404
+          
+           if op['op'] == 'add':
+               cart[animal_id] = cart.get(animal_id, 0) + quantity
+               added.add(animal_id)
+           elif op['op'] == 'update':
+               cart[animal_id] = quantity
+           else:
+               del cart[animal_id]
+      
+       inserts = [animal_id for animal_id in cart if animal_id not in current]
+       updates = {animal_id: cart[animal_id] for animal_id in cart if animal_id in current and cart[animal_id] != current[animal_id]}
+       deletes = [animal_id for animal_id in current if animal_id not in cart]
+      
+       # Animals added in this batch must still be for sale and not held by another buyer
+       added &= set(cart)
+       if added:
+           available = set(db.session.scalars(
+               db.select(Animal.id).where(Animal.id.in_(added), Animal.status == 'available')
+           ))
+           if added - available:
+               return jsonify({'message': 'Animal is not available', 'animalIds': sorted(added - available)}), 400
+           held = reserve_animals(added, user_id)
+           if held:
+               db.session.rollback()
+               return jsonify({'message': 'Animal is reserved by another buyer', 'animalIds': sorted(held)}), 409
+      
+       if inserts:
+           db.session.execute(sa.insert(CartItem), [
+               {'id': str(uuid.uuid4()), 'user_id': user_id, 'animal_id': animal_id, 'quantity': cart[animal_id]}
+               for animal_id in inserts
+           ])
+       if updates:
+           db.session.execute(
+               sa.update(CartItem).where(
+                   CartItem.user_id == user_id, CartItem.animal_id.in_(updates)
+               ).values(quantity=db.case(updates, value=CartItem.animal_id))
+               .execution_options(synchronize_session=False)
+           )
+       if deletes:
+           db.session.execute(
+               sa.delete(CartItem).where(
+                   CartItem.user_id == user_id, CartItem.animal_id.in_(deletes)
+               ).execution_options(synchronize_session=False)
+           )
+           release_reservations(user_id, deletes)
+       if len(inserts) != len(deletes):
+           bump_stats(user_id, cart_items=len(inserts) - len(deletes))
+      
+       try:
+           db.session.commit()
+       except IntegrityError:
+           # A concurrent request changed the same cart rows
+           db.session.rollback()
+           return jsonify({'message': 'Cart changed during the update, please retry'}), 409
+      
+       cart_items = CartItem.query.options(*cart_item_loader()).filter_by(user_id=user_id).all()
+       return jsonify([serialize(item) for item in cart_items])
+      
+   except Exception as e:
+       return server_error(e)
 
 
 # Order Routes
-@app.route('/api/orders', methods=['POST'])
+@api.route('/api/orders', methods=['POST'])
 @jwt_required()
 def create_order():
    try:
        user_id = get_jwt_identity()
-       user = User.query.get(user_id)
+       user = current_user
        data = request.get_json()
       
+       # Merge repeated animals and validate quantities before touching the database
+       quantities = {}
+       try:
+           items = data['items']
+           if not isinstance(items, list) or not all(isinstance(item_data, dict) for item_data in items):
+               raise TypeError
+           for item_data in items:
+               quantity = int(item_data.get('quantity', 1))
+               if quantity < 1:
+                   raise ValueError
+               quantities[item_data['animalId']] = quantities.get(item_data['animalId'], 0) + quantity
+       except (KeyError, TypeError, ValueError):
+           return jsonify({'message': 'Invalid order items'}), 400
+       if not quantities:
+           return jsonify({'message': 'Order has no items'}), 400
+      
+       # Load every referenced animal with its farmer in one query; prices and
+       # names come from here, never from the client. On PostgreSQL the animal
+       # rows are locked, skipping any another checkout already holds so
+       # contending buyers fail fast instead of queueing behind each other.
+       query = db.session.query(Animal, User).join(User, Animal.farmer_id == User.id).filter(
+           Animal.id.in_(quantities)
+       )
+       if db.engine.dialect.name == 'postgresql':
+           query = query.with_for_update(of=Animal, skip_locked=True)
+       listings = query.all()
+       if len(listings) != len(quantities):
+           db.session.rollback()
+           if db.session.query(Animal.id).filter(Animal.id.in_(quantities)).count() == len(quantities):
+               return jsonify({'message': 'Animal is being purchased by another buyer'}), 409
+           return jsonify({'message': 'Animal not found'}), 404
+       if any(animal.status != 'available' for animal, farmer in listings):
+           db.session.rollback()
+           return jsonify({'message': 'Animal is not available'}), 400
+      
+       # Claim the animals: the conditional update is the real guard against
+       # double sales on every backend, including SQLite without row locks
+       if transition_animals(list(quantities), 'available', 'sold', buyer_id=user_id) != len(quantities):
+           db.session.rollback()
+           return jsonify({'message': 'Animal is reserved by another buyer'}), 409
+      
        order = Order(
            id=str(uuid.uuid4()),
            user_id=user_id,
-           total_amount=data['totalAmount'],
+           total_amount=sum(animal.price * quantities[animal.id] for animal, farmer in listings),
            shipping_address=data['shippingAddress'],
            payment_method=data.get('paymentMethod', 'card'),
            notes=data.get('notes', '')
        )
-      
        db.session.add(order)
-       db.session.flush()  # Get the order ID
-      
-       # Add order items and notify farmers
-       farmers_to_notify = set()
-       for item_data in data['items']:
-           order_item = OrderItem(
-               id=str(uuid.uuid4()),
-               order_id=order.id,
-               animal_id=item_data['animalId'],
-               animal_name=item_data['animalName'],
-               quantity=item_data['quantity'],
-               price=item_data['price'],
-               farmer_id=item_data['farmerId'],
-               farmer_name=item_data['farmerName']
-           )
-           db.session.add(order_item)
-           farmers_to_notify.add(item_data['farmerId'])
+       db.session.flush()
+      
+       db.session.execute(sa.insert(OrderItem), [
+           {
+               'id': str(uuid.uuid4()),
+               'order_id': order.id,
+               'animal_id': animal.id,
+               'animal_name': animal.name,
+               'animal_type': animal.type,
+               'quantity': quantities[animal.id],
+               'price': animal.price,
+               'farmer_id': farmer.id,
+               'farmer_name': farmer.name
+           }
+           for animal, farmer in listings
+       ])
+       farmers_to_notify = {farmer.id: farmer for animal, farmer in listings}
       
        # Clear cart items
-       CartItem.query.filter(
+       cleared = CartItem.query.filter(
            CartItem.user_id == user_id,
-           CartItem.animal_id.in_([item['animalId'] for item in data['items']])
+           CartItem.animal_id.in_(quantities)
        ).delete(synchronize_session=False)
       
-       db.session.commit()
+       release_reservations(user_id, list(quantities))
       
-       # Send confirmation email to buyer
+       bump_stats(user_id, total_orders=1, cart_items=-cleared)
+       bump_stats_many(farmers_to_notify, pending_orders=1)
+       farmer_counts = {}
+       for animal, farmer in listings:
+           farmer_counts[farmer.id] = farmer_counts.get(farmer.id, 0) + 1
+       bump_inventory_stats(farmer_counts, 'available', 'sold')
+      
+       # Queue confirmation email to buyer
        buyer_html = f"""
        <h2>Order Confirmation - Farmart</h2>
        <p>Dear {user.name},</p>
@@ -651,55 +2383,94 @@ def create_order():
        <p><strong>Total Amount:</strong> ${order.total_amount}</p>
        <p>We'll notify you once the farmers confirm your order.</p>
        """
-       send_email(user.email, f"Order Confirmation #{order.id[:8]}", buyer_html)
-      
-       # Send notification emails to farmers
-       for farmer_id in farmers_to_notify:
-           farmer = User.query.get(farmer_id)
-           if farmer:
-               farmer_html = f"""
-               <h2>New Order Received - Farmart</h2>
-               <p>Dear {farmer.name},</p>
-               <p>You have received a new order from {user.name}.</p>
-               <p><strong>Order ID:</strong> #{order.id[:8]}</p>
-               <p>Please log in to your dashboard to review and confirm the order.</p>
-               """
-               send_email(farmer.email, f"New Order #{order.id[:8]}", farmer_html)
+       queue_email(user.email, f"Order Confirmation #{order.id[:8]}", buyer_html)
+      
+       # Queue notification emails to farmers
+       for farmer in farmers_to_notify.values():
+           farmer_html = f"""
+           <h2>New Order Received - Farmart</h2>
+           <p>Dear {farmer.name},</p>
+           <p>You have received a new order from {user.name}.</p>
+           <p><strong>Order ID:</strong> #{order.id[:8]}</p>
+           <p>Please log in to your dashboard to review and confirm the order.</p>
+           """
+           queue_email(farmer.email, f"New Order #{order.id[:8]}", farmer_html)
+      
+       db.session.commit()
+       listing_cache.clear()
       
        return jsonify(serialize_order(order)), 201
       
    except Exception as e:
-       return jsonify({'message': 'Server error'}), 500
+       return server_error(e)
 
 
-@app.route('/api/orders', methods=['GET'])
+@api.route('/api/orders', methods=['GET'])
 @jwt_required()
 def get_orders():
+   """Orders newest first, filterable by status and date range, keyset paginated.
+
+   Buyers see the orders they placed; farmers see orders containing their
+   animals, with only their own items.
+   """
    try:
+       try:
+           serialize = order_serializer.plan(requested_fields())
+       except UnknownFieldError as e:
+           return jsonify({'message': str(e)}), 400
        user_id = get_jwt_identity()
-       user = User.query.get(user_id)
+       user = current_user
       
        if user.user_type == 'farmer':
-           # Get orders for animals owned by this farmer
-           orders = db.session.query(Order).join(OrderItem).filter(
-               OrderItem.farmer_id == user_id
-           ).distinct().order_by(Order.created_at.desc()).all()
+           # Only the farmer's items are loaded into each order's collection
+           query = Order.query.options(selectinload(Order.items.and_(OrderItem.farmer_id == user_id))).filter(
+               Order.id.in_(db.select(OrderItem.order_id).where(OrderItem.farmer_id == user_id))
+           )
        else:
-           # Get orders placed by this user
-           orders = Order.query.filter_by(user_id=user_id).order_by(Order.created_at.desc()).all()
+           query = Order.query.options(*order_loader()).filter(Order.user_id == user_id)
+      
+       statuses = [status for status in request.args.get('status', '').split(',') if status]
+       if statuses:
+           query = query.filter(Order.status.in_(statuses))
+       try:
+           start, end = parse_date_range()
+       except ValueError:
+           return jsonify({'message': 'Invalid date range'}), 400
+       if start:
+           query = query.filter(Order.created_at >= start)
+       if end:
+           query = query.filter(Order.created_at < end)
+      
+       limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+       limit = max(1, min(limit, MAX_PAGE_SIZE))
+       cursor = request.args.get('cursor', '')
+       if cursor:
+           position = decode_cursor(cursor)
+           try:
+               position[0] = datetime.fromisoformat(position[0])
+           except (TypeError, ValueError):
+               return jsonify({'message': 'Invalid cursor'}), 400
+           query = query.filter(db.tuple_(Order.created_at, Order.id) < tuple(position))
+      
+       orders = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1).all()
+       has_more = len(orders) > limit
+       orders = orders[:limit]
       
-       return jsonify([serialize_order(order) for order in orders])
+       response = jsonify([serialize(order) for order in orders])
+       if has_more:
+           set_next_page(response, encode_cursor(orders[-1].created_at.isoformat(), orders[-1].id), limit)
+       return response
       
    except Exception as e:
-       return jsonify({'message': 'Server error'}), 500
+       return server_error(e)
 
 
-@app.route('/api/orders/<order_id>/status', methods=['PUT'])
+@api.route('/api/orders/<order_id>/status', methods=['PUT'])
 @jwt_required()
 def update_order_status(order_id):
    try:
        user_id = get_jwt_identity()
-       user = User.query.get(user_id)
+       user = current_user
        data = request.get_json()
       
        if user.user_type != 'farmer':
@@ -717,9 +2488,36 @@ def update_order_status(order_id):
        old_status = order.status
        order.status = data['status']
        order.updated_at = datetime.utcnow()
-       db.session.commit()
       
-       # Send status update email to buyer
+       # Rejected or cancelled orders return their animals to the catalog, and
+       # reopening such an order has to win them back
+       released = old_status in RELEASED_ORDER_STATUSES
+       releasing = order.status in RELEASED_ORDER_STATUSES
+       if released != releasing:
+           from_status, to_status = ('sold', 'available') if releasing else ('available', 'sold')
+           animal_ids = {item.animal_id for item in order.items}
+           movable = db.session.query(Animal.id, Animal.farmer_id).filter(
+               Animal.id.in_(animal_ids),
+               Animal.status == from_status
+           ).all()
+           if not releasing and len(movable) != len(animal_ids):
+               db.session.rollback()
+               return jsonify({'message': 'Animals in this order are no longer available'}), 409
+           if transition_animals([animal_id for animal_id, farmer_id in movable], from_status, to_status) != len(movable):
+               db.session.rollback()
+               return jsonify({'message': 'Order changed concurrently, please retry'}), 409
+           farmer_counts = {}
+           for animal_id, farmer_id in movable:
+               farmer_counts[farmer_id] = farmer_counts.get(farmer_id, 0) + 1
+           bump_inventory_stats(farmer_counts, from_status, to_status)
+      
+       db.session.flush()
+       for stats_user_id, deltas in order_stats_deltas(order, old_status, order.status).items():
+           bump_stats(stats_user_id, **deltas)
+       if (old_status == 'completed') != (order.status == 'completed'):
+           bump_daily_sales(order, 1 if order.status == 'completed' else -1)
+      
+       # Queue status update email to buyer
        buyer = User.query.get(order.user_id)
        if buyer:
            status_html = f"""
@@ -730,21 +2528,79 @@ def update_order_status(order_id):
            <p><strong>New Status:</strong> {order.status.title()}</p>
            <p>Thank you for choosing Farmart!</p>
            """
-           send_email(buyer.email, f"Order Status Update #{order.id[:8]}", status_html)
+           queue_email(buyer.email, f"Order Status Update #{order.id[:8]}", status_html)
+      
+       db.session.commit()
+       listing_cache.clear()
       
        return jsonify(serialize_order(order))
       
    except Exception as e:
-       return jsonify({'message': 'Server error'}), 500
+       return server_error(e)
+
+
+# Export Routes
+@api.route('/api/export/orders', methods=['GET'])
+@jwt_required()
+def export_orders():
+   try:
+       user_id = get_jwt_identity()
+       user = current_user
+      
+       if user.user_type != 'farmer':
+           return jsonify({'message': 'Only farmers can export sales'}), 403
+      
+       # One row per item the farmer sold, newest orders first
+       statement = db.select(
+           Order.id, Order.created_at, Order.status, Order.payment_status,
+           OrderItem.animal_id, OrderItem.animal_name, OrderItem.quantity, OrderItem.price,
+           OrderItem.price * OrderItem.quantity
+       ).join(Order, Order.id == OrderItem.order_id).where(
+           OrderItem.farmer_id == user_id
+       ).order_by(Order.created_at.desc(), Order.id)
+       columns = [
+           'orderId', 'orderDate', 'orderStatus', 'paymentStatus',
+           'animalId', 'animalName', 'quantity', 'price', 'subtotal'
+       ]
+       return export_response(statement, columns, 'orders')
+      
+   except Exception as e:
+       return server_error(e)
+
+
+@api.route('/api/export/animals', methods=['GET'])
+@jwt_required()
+def export_animals():
+   try:
+       user_id = get_jwt_identity()
+       user = current_user
+      
+       if user.user_type != 'farmer':
+           return jsonify({'message': 'Only farmers can export listings'}), 403
+      
+       statement = db.select(
+           Animal.id, Animal.name, Animal.type, Animal.breed, Animal.age, Animal.weight, Animal.price,
+           Animal.description, Animal.images, Animal.health_status, Animal.vaccination_status,
+           Animal.status, Animal.created_at, Animal.updated_at
+       ).where(Animal.farmer_id == user_id).order_by(Animal.created_at.desc(), Animal.id)
+       columns = [
+           'id', 'name', 'type', 'breed', 'age', 'weight', 'price',
+           'description', 'images', 'healthStatus', 'vaccinationStatus',
+           'status', 'createdAt', 'updatedAt'
+       ]
+       return export_response(statement, columns, 'animals')
+      
+   except Exception as e:
+       return server_error(e)
 
 
 # User Profile Routes
-@app.route('/api/profile', methods=['GET'])
+@api.route('/api/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
    try:
        user_id = get_jwt_identity()
-       user = User.query.get(user_id)
+       user = current_user
       
        if not user:
            return jsonify({'message': 'User not found'}), 404
@@ -752,15 +2608,15 @@ def get_profile():
        return jsonify(serialize_user(user))
       
    except Exception as e:
-       return jsonify({'message': 'Server error'}), 500
+       return server_error(e)
 
 
-@app.route('/api/profile', methods=['PUT'])
+@api.route('/api/profile', methods=['PUT'])
 @jwt_required()
 def update_profile():
    try:
        user_id = get_jwt_identity()
-       user = User.query.get(user_id)
+       user = current_user
       
        if not user:
            return jsonify({'message': 'User not found'}), 404
@@ -769,68 +2625,191 @@ def update_profile():
       
        user.name = data.get('name', user.name)
        user.phone = data.get('phone', user.phone)
-       user.location = data.get('location', user.location)
+       if data.get('location', user.location) != user.location:
+           user.location = data['location']
+           geocode_user(user)
        user.profile_image = data.get('profileImage', user.profile_image)
       
        db.session.commit()
+       user_cache.pop(user_id)
+       if user.user_type == 'farmer':
+           # Listings embed the farmer's name, location and phone
+           listing_cache.clear()
       
        return jsonify(serialize_user(user))
       
    except Exception as e:
-       return jsonify({'message': 'Server error'}), 500
+       return server_error(e)
 
 
 # Dashboard Stats Routes
-@app.route('/api/dashboard/stats', methods=['GET'])
+@api.route('/api/dashboard/stats', methods=['GET'])
 @jwt_required()
+@replica_read
 def get_dashboard_stats():
    try:
        user_id = get_jwt_identity()
-       user = User.query.get(user_id)
-      
-       if user.user_type == 'farmer':
-           total_animals = Animal.query.filter_by(farmer_id=user_id).count()
-           available_animals = Animal.query.filter_by(farmer_id=user_id, status='available').count()
-           sold_animals = Animal.query.filter_by(farmer_id=user_id, status='sold').count()
-          
-           # Calculate total revenue from completed orders
-           total_revenue = db.session.query(db.func.sum(OrderItem.price * OrderItem.quantity)).filter(
-               OrderItem.farmer_id == user_id
-           ).join(Order).filter(Order.status == 'completed').scalar() or 0
-          
-           pending_orders = db.session.query(Order.id).join(OrderItem).filter(
-                OrderItem.farmer_id == user_id,
-                Order.status == 'pending'
-            ).distinct(Order.id).count()
-          
+       user_type, counters = db.session.query(User.user_type, UserStats).outerjoin(
+           UserStats, UserStats.user_id == User.id
+       ).filter(User.id == user_id).one()
+      
+       if counters is None:
+           # No counters row yet (the user predates the table); build it once,
+           # from and on the primary even when this request reads from a replica
+           with on_primary():
+               counters = UserStats(user_id=user_id, **compute_user_stats([user_id])[user_id])
+               db.session.add(counters)
+               try:
+                   db.session.commit()
+               except IntegrityError:
+                   db.session.rollback()
+               else:
+                   # The commit expired it, and the replica may not have the row yet
+                   db.session.refresh(counters)
+      
+       if user_type == 'farmer':
            stats = {
-               'totalAnimals': total_animals,
-               'availableAnimals': available_animals,
-               'soldAnimals': sold_animals,
-               'totalRevenue': total_revenue,
-               'pendingOrders': pending_orders
+               'totalAnimals': counters.total_animals,
+               'availableAnimals': counters.available_animals,
+               'soldAnimals': counters.sold_animals,
+               'totalRevenue': counters.total_revenue,
+               'pendingOrders': counters.pending_orders
            }
        else:
-           cart_items = CartItem.query.filter_by(user_id=user_id).count()
-           total_orders = Order.query.filter_by(user_id=user_id).count()
-           total_spent = db.session.query(db.func.sum(Order.total_amount)).filter(
-               Order.user_id == user_id,
-               Order.status == 'completed'
-           ).scalar() or 0
-          
            stats = {
-               'cartItems': cart_items,
-               'totalOrders': total_orders,
-               'totalSpent': total_spent,
+               'cartItems': counters.cart_items,
+               'totalOrders': counters.total_orders,
+               'totalSpent': counters.total_spent,
                'favoriteAnimals': 0  # Placeholder for future feature
            }
       
        return jsonify(stats)
       
    except Exception as e:
-    import traceback
-    traceback.print_exc()  # <-- shows full error stack trace in terminal
-    return jsonify({'message': 'Server error', 'error': str(e)}), 500
+       return server_error(e)
+
+
+@api.route('/api/analytics/sales', methods=['GET'])
+@jwt_required()
+@replica_read
+def get_sales_analytics():
+   """A farmer's completed sales over a date range, from the daily rollup.
+
+   Query parameters: from/to (dates, default the last DEFAULT_ANALYTICS_DAYS
+   days), interval (day, week or month) and type (comma-separated animal
+   types). Returns totals, a zero-filled revenue series and sales by type.
+   """
+   try:
+       user_id = get_jwt_identity()
+       if current_user.user_type != 'farmer':
+           return jsonify({'message': 'Only farmers can view sales analytics'}), 403
+      
+       interval = request.args.get('interval', 'day')
+       if interval not in ANALYTICS_INTERVALS:
+           return jsonify({'message': f"interval must be one of {', '.join(ANALYTICS_INTERVALS)}"}), 400
+       try:
+           start, end = parse_date_range()
+       except ValueError:
+           return jsonify({'message': 'Invalid date range'}), 400
+       last_day = (end - timedelta(microseconds=1)).date() if end else datetime.utcnow().date()
+       first_day = start.date() if start else last_day - timedelta(days=DEFAULT_ANALYTICS_DAYS - 1)
+       if first_day > last_day or (last_day - first_day).days >= MAX_ANALYTICS_DAYS:
+           return jsonify({'message': f'Date range must span 1 to {MAX_ANALYTICS_DAYS} days'}), 400
+      
+       query = db.session.query(
+           FarmerDailySales.day, FarmerDailySales.animal_type, FarmerDailySales.revenue,
+           FarmerDailySales.units, FarmerDailySales.orders
+       ).filter(
+           FarmerDailySales.farmer_id == user_id,
+           FarmerDailySales.day.between(first_day, last_day),
+           # Rows emptied by reopened orders
+           FarmerDailySales.orders > 0
+       )
+       types = [animal_type for animal_type in request.args.get('type', '').split(',') if animal_type]
+       if types:
+           query = query.filter(FarmerDailySales.animal_type.in_(types))
+      
+       # Rollup rows are few (days x types), so bucketing them here keeps the SQL portable
+       periods = {}
+       period = period_start(first_day, interval)
+       while period <= last_day:
+           periods[period] = {'revenue': 0, 'units': 0}
+           period = next_period(period, interval)
+       by_type = {}
+       for day, animal_type, revenue, units, orders in query:
+           bucket = periods[period_start(day, interval)]
+           bucket['revenue'] += revenue
+           bucket['units'] += units
+           totals = by_type.setdefault(animal_type, {'type': animal_type, 'revenue': 0, 'units': 0, 'orders': 0})
+           totals['revenue'] += revenue
+           totals['units'] += units
+           totals['orders'] += orders
+      
+       return jsonify({
+           'from': first_day.isoformat(),
+           'to': last_day.isoformat(),
+           'interval': interval,
+           'totals': {
+               'revenue': round(sum(bucket['revenue'] for bucket in periods.values()), 2),
+               'units': sum(bucket['units'] for bucket in periods.values())
+           },
+           'series': [
+               {'period': period.isoformat(), 'revenue': round(bucket['revenue'], 2), 'units': bucket['units']}
+               for period, bucket in periods.items()
+           ],
+           'byType': [
+               dict(totals, revenue=round(totals['revenue'], 2))
+               for totals in sorted(by_type.values(), key=lambda totals: -totals['revenue'])
+           ]
+       })
+      
+   except Exception as e:
+       return server_error(e)
+
+
+@api.cli.command('rebuild-stats')
+def rebuild_stats_command():
+   """Recompute every user's dashboard counters from the source tables"""
+   count = rebuild_user_stats()
+   print(f"Rebuilt dashboard stats for {count} users")
+
+
+@api.cli.command('rebuild-sales-rollup')
+def rebuild_sales_rollup_command():
+   """Recompute the daily sales rollup from completed orders"""
+   count = rebuild_daily_sales()
+   print(f"Rebuilt the sales rollup with {count} rows")
+
+
+@api.cli.command('sweep-reservations')
+@click.option('--interval', type=float, default=0, help='Keep sweeping every N seconds')
+def sweep_reservations_command(interval):
+   """Delete expired cart reservations"""
+   while True:
+       removed = sweep_expired_reservations()
+       print(f"Removed {removed} expired reservations")
+       if not interval:
+           break
+       time.sleep(interval)
+
+
+@api.cli.command('geocode-users')
+def geocode_users_command():
+   """Geocode every user's location against the gazetteer"""
+   located = 0
+   users = User.query.all()
+   for user in users:
+       geocode_user(user)
+       located += user.latitude is not None
+   db.session.commit()
+   print(f"Geocoded {located} of {len(users)} users")
+
+
+@api.cli.command('gc-images')
+def gc_images_command():
+   """Queue deletion of uploaded images no listing references"""
+   queued = collect_orphaned_images()
+   print(f"Queued {queued} orphaned images for deletion")
 
 
 # Initialize database
@@ -863,6 +2842,8 @@ def create_tables():
            is_verified=True
        )
       
+       geocode_user(farmer)
+       geocode_user(buyer)
        db.session.add(farmer)
        db.session.add(buyer)
        db.session.commit()
@@ -916,10 +2897,42 @@ def create_tables():
        for animal in animals:
            db.session.add(animal)
       
+       db.session.flush()
+       for animal in animals:
+           index_animal_search(animal)
+      
        db.session.commit()
 
 
+def create_app(config_name=None):
+   """Application factory. Schema migrations are not run here; apply them as a
+   release step with `flask db upgrade`."""
+   app = Flask(__name__)
+   app.config.from_object(config[config_name or os.getenv('FLASK_CONFIG', 'default')])
+   app.json = JSONProvider(app)
+  
+   db.init_app(app)
+   migrate.init_app(app, db)
+   jwt.init_app(app)
+   cors.init_app(app)
+  
+   listing_cache.max_entries = app.config['LISTING_CACHE_SIZE']
+   listing_cache.ttl = app.config['LISTING_CACHE_TTL']
+   user_cache.max_entries = app.config['USER_CACHE_SIZE']
+   user_cache.ttl = app.config['USER_CACHE_TTL']
+   recent_writers.ttl = app.config['REPLICA_STICKY_SECONDS']
+   for name, service in external_services.items():
+       service.bulkhead.max_concurrent = app.config[f'{name.upper()}_MAX_CONCURRENCY']
+       service.bulkhead.max_wait = app.config['BULKHEAD_WAIT_SECONDS']
+       service.breaker.failure_threshold = app.config['CIRCUIT_FAILURE_THRESHOLD']
+       service.breaker.reset_timeout = app.config['CIRCUIT_RESET_SECONDS']
+  
+   app.register_blueprint(api)
+   return app
+
+
 if __name__ == '__main__':
+   app = create_app()
    with app.app_context():
        create_tables()
    app.run(debug=True, port=5000)
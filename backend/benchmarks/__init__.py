@@ -0,0 +1,4 @@
+"""
+Farmart performance benchmarks
+Run modules from the backend directory, e.g. `python -m benchmarks.startup`
+"""
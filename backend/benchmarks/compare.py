@@ -0,0 +1,66 @@
+"""
+Compare two load-test result files
+
+Prints per-route latency and statement-count changes between a baseline and
+a candidate run of benchmarks.load, and exits 1 when any route's p95 grew by
+more than --threshold percent or it started issuing more SQL per request.
+
+   python -m benchmarks.compare results/before.json results/after.json
+"""
+
+
+import argparse
+import json
+import sys
+
+
+def change(before, after):
+   return (after - before) / before * 100 if before else 0.0
+
+
+def main(argv=None):
+   parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+   parser.add_argument('baseline')
+   parser.add_argument('candidate')
+   parser.add_argument('--threshold', type=float, default=10, help='allowed p95 slowdown in percent')
+   parser.add_argument('--min-requests', type=int, default=20, help='ignore routes with fewer samples')
+   args = parser.parse_args(argv)
+  
+   with open(args.baseline) as f:
+       baseline = json.load(f)
+   with open(args.candidate) as f:
+       candidate = json.load(f)
+   for key in ('database', 'clients', 'sizes', 'listing_cache'):
+       if baseline['meta'].get(key) != candidate['meta'].get(key):
+           print(f"WARNING: runs differ in {key}: {baseline['meta'].get(key)} vs {candidate['meta'].get(key)}")
+  
+   failures = []
+   print(f"{'route':<34} {'p50':>16} {'p95':>16} {'p99':>16} {'sql/req':>12}")
+   routes = dict(candidate['routes'], TOTAL=candidate['total'])
+   for route, after in routes.items():
+       before = baseline['total'] if route == 'TOTAL' else baseline['routes'].get(route)
+       if before is None:
+           print(f"{route:<34} (new)")
+           continue
+       cells = []
+       for key in ('p50', 'p95', 'p99'):
+           old, new = before['latency_ms'][key], after['latency_ms'][key]
+           cells.append(f"{new:>7.1f} {change(old, new):>+7.1f}%")
+       queries = f"{before['queries_per_request']:.1f}->{after['queries_per_request']:.1f}"
+       print(f"{route:<34} {' '.join(cells)} {queries:>12}")
+  
+       if min(before['requests'], after['requests']) < args.min_requests:
+           continue
+       slowdown = change(before['latency_ms']['p95'], after['latency_ms']['p95'])
+       if slowdown > args.threshold:
+           failures.append(f"{route}: p95 {slowdown:+.1f}%")
+       if after['queries_per_request'] > before['queries_per_request'] + 0.5:
+           failures.append(f"{route}: {queries} SQL statements per request")
+  
+   for failure in failures:
+       print(f"FAIL: {failure}")
+   return 1 if failures else 0
+
+
+if __name__ == '__main__':
+   sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Checkout contention stress test
+
+Seeds listings and buyers into a scratch database, then releases many
+threads at once to check out the same animal through the real
+POST /api/orders route, one listing per round. Fails (exit 1) unless every
+round produces exactly one sale, the listing ends up sold, and no checkout
+waited longer than --max-wait-ms (a lock convoy would show up there).
+"""
+
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from flask_jwt_extended import create_access_token
+from flask_migrate import upgrade
+
+
+def seed(buyers, rounds):
+   from app import db, User, Animal
+   farmer = User(
+       id=str(uuid.uuid4()), email=f'{uuid.uuid4()}@farm.test', password_hash='-', name='Stress Farmer',
+       user_type='farmer', phone='0', location='Nakuru, Kenya'
+   )
+   buyer_ids = [str(uuid.uuid4()) for _ in range(buyers)]
+   db.session.add(farmer)
+   db.session.add_all(
+       User(id=buyer_id, email=f'{buyer_id}@buyer.test', password_hash='-', name='Stress Buyer',
+            user_type='buyer', phone='0', location='Nairobi, Kenya')
+       for buyer_id in buyer_ids
+   )
+   animal_ids = [str(uuid.uuid4()) for _ in range(rounds)]
+   db.session.add_all(
+       Animal(id=animal_id, name='Hot Listing', type='Cattle', breed='Boran', age=2, weight=400,
+              price=1000, description='Contended listing', images=[], farmer_id=farmer.id)
+       for animal_id in animal_ids
+   )
+   db.session.commit()
+   return buyer_ids, animal_ids
+
+
+def hammer(app, tokens, animal_id):
+   """Fire one checkout per buyer at the same instant; returns [(status, seconds)]"""
+   barrier = threading.Barrier(len(tokens))
+   results = [None] * len(tokens)
+  
+   def checkout(index, token):
+       client = app.test_client()
+       barrier.wait()
+       started = time.perf_counter()
+       response = client.post(
+           '/api/orders',
+           json={'items': [{'animalId': animal_id, 'quantity': 1}], 'shippingAddress': {}},
+           headers={'Authorization': f'Bearer {token}'}
+       )
+       results[index] = (response.status_code, time.perf_counter() - started)
+  
+   threads = [threading.Thread(target=checkout, args=(i, token)) for i, token in enumerate(tokens)]
+   for thread in threads:
+       thread.start()
+   for thread in threads:
+       thread.join()
+   return results
+
+
+def main(argv=None):
+   parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+   parser.add_argument('--threads', type=int, default=32, help='concurrent buyers per listing')
+   parser.add_argument('--rounds', type=int, default=20, help='number of listings to fight over')
+   parser.add_argument('--database-url', help='defaults to a scratch SQLite file')
+   parser.add_argument('--max-wait-ms', type=float, default=5000, help='fail if any checkout takes longer')
+   args = parser.parse_args(argv)
+  
+   scratch = None
+   if not args.database_url:
+       scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+       args.database_url = f'sqlite:///{scratch.name}'
+   # config.py reads the environment at import time, so set it before importing the app
+   os.environ['DATABASE_URL'] = args.database_url
+   from app import create_app, db, Animal, OrderItem
+  
+   app = create_app()
+   failures = []
+   latencies = []
+   try:
+       with app.app_context():
+           upgrade(directory=os.path.join(BACKEND_DIR, 'migrations'))
+           buyer_ids, animal_ids = seed(args.threads, args.rounds)
+           tokens = [create_access_token(identity=buyer_id) for buyer_id in buyer_ids]
+      
+       for animal_id in animal_ids:
+           results = hammer(app, tokens, animal_id)
+           latencies.extend(seconds * 1000 for status, seconds in results)
+           statuses = [status for status, seconds in results]
+           with app.app_context():
+               sold = db.session.query(OrderItem).filter_by(animal_id=animal_id).count()
+               status = db.session.get(Animal, animal_id).status
+           if statuses.count(201) != 1 or sold != 1 or status != 'sold':
+               failures.append(f"{animal_id}: {statuses.count(201)} successful checkouts, "
+                               f"{sold} order items, status {status!r}, responses {sorted(set(statuses))}")
+   finally:
+       if scratch:
+           os.unlink(scratch.name)
+  
+   latencies.sort()
+   p99 = latencies[int(len(latencies) * 0.99) - 1]
+   print(f"{args.rounds} listings x {args.threads} buyers: "
+         f"p50 {statistics.median(latencies):.1f} ms, p99 {p99:.1f} ms, max {latencies[-1]:.1f} ms")
+   if latencies[-1] > args.max_wait_ms:
+       failures.append(f"slowest checkout took {latencies[-1]:.0f} ms")
+   for failure in failures:
+       print(f"FAIL: {failure}")
+   return 1 if failures else 0
+
+
+if __name__ == '__main__':
+   sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Local stand-ins for SendGrid and Cloudinary with injected latency and errors
+
+Answers the calls the app makes (mail send, image upload, bulk image delete)
+after --latency seconds, failing a --error-rate fraction of them with
+--error-status, so timeouts, bulkheads and circuit breakers can be exercised
+without touching the real providers. Point the app at it with
+
+   SENDGRID_API_HOST=http://127.0.0.1:8025 CLOUDINARY_API_HOST=http://127.0.0.1:8025
+
+   python -m benchmarks.fake_providers --port 8025 --latency 3 --error-rate 0.5
+"""
+
+
+import argparse
+import json
+import random
+import sys
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+   # Set from the command line (or by a test) before serving
+   latency = 0.0
+   error_rate = 0.0
+   error_status = 503
+   calls = 0
+
+   def respond(self, status, body=None):
+       payload = json.dumps(body).encode() if body is not None else b''
+       self.send_response(status)
+       self.send_header('Content-Type', 'application/json')
+       self.send_header('Content-Length', str(len(payload)))
+       self.end_headers()
+       self.wfile.write(payload)
+
+   def handle_call(self):
+       type(self).calls += 1
+       length = int(self.headers.get('Content-Length') or 0)
+       if length:
+           self.rfile.read(length)
+       time.sleep(self.latency)
+       if random.random() < self.error_rate:
+           self.respond(self.error_status, {'error': {'message': 'Injected failure'}, 'errors': [{'message': 'Injected failure'}]})
+           return
+
+       url = urlsplit(self.path)
+       if url.path == '/v3/mail/send':
+           self.respond(202)
+       elif url.path.endswith('/image/upload'):
+           public_id = f'farmart/animals/{uuid.uuid4().hex}'
+           self.respond(200, {
+               'public_id': public_id,
+               'version': int(time.time()),
+               'secure_url': f'https://fake.cloudinary.local/{public_id}.jpg'
+           })
+       elif url.path.endswith('/resources/image/upload'):
+           public_ids = parse_qs(url.query).get('public_ids[]', [])
+           self.respond(200, {'deleted': dict.fromkeys(public_ids, 'deleted')})
+       else:
+           self.respond(404, {'error': {'message': 'Not found'}})
+
+   do_POST = handle_call
+   do_DELETE = handle_call
+
+   def log_message(self, format, *args):
+       pass
+
+
+def serve(port, latency=0.0, error_rate=0.0, error_status=503):
+   """Build the fake providers' server; run it with serve_forever()"""
+   FakeProviderHandler.latency = latency
+   FakeProviderHandler.error_rate = error_rate
+   FakeProviderHandler.error_status = error_status
+   server = ThreadingHTTPServer(('127.0.0.1', port), FakeProviderHandler)
+   server.daemon_threads = True
+   return server
+
+
+def main(argv=None):
+   parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+   parser.add_argument('--port', type=int, default=8025)
+   parser.add_argument('--latency', type=float, default=0.0, help='seconds before every response')
+   parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls answered with --error-status')
+   parser.add_argument('--error-status', type=int, default=503)
+   args = parser.parse_args(argv)
+
+   server = serve(args.port, args.latency, args.error_rate, args.error_status)
+   print(f"Fake SendGrid and Cloudinary on http://127.0.0.1:{args.port}")
+   try:
+       server.serve_forever()
+   except KeyboardInterrupt:
+       pass
+   return 0
+
+
+if __name__ == '__main__':
+   sys.exit(main())
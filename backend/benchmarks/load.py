@@ -0,0 +1,279 @@
+"""
+Concurrent load test over the real API routes
+
+Seeds a synthetic marketplace (see benchmarks.seed) unless the database
+already has one, then runs --clients threads for --duration seconds. Each
+client repeatedly picks a scenario from the weighted --mix (browse, search,
+cart, checkout, dashboard, orders) and drives it through the Flask test
+client, so every request passes through routing, auth, the handlers and the
+database exactly as in production. Per route it reports p50/p95/p99 latency,
+throughput and SQL statements per request, and writes the results as JSON
+for benchmarks.compare.
+
+   python -m benchmarks.load --database-url sqlite:////tmp/farmart.db --clients 8 --duration 30
+"""
+
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.seed import BREEDS, LOCATIONS, TRAITS, add_size_arguments, seed
+
+
+DEFAULT_MIX = 'browse=40,search=20,cart=15,checkout=5,dashboard=10,orders=10'
+SEARCH_TERMS = [breed for breeds in BREEDS.values() for breed in breeds] + TRAITS
+
+
+class Recorder:
+   """Collects (route, status, seconds, statements) samples from every client thread"""
+
+   def __init__(self):
+       self.samples = defaultdict(list)
+       self._lock = threading.Lock()
+       self._local = threading.local()
+
+   def reset(self):
+       with self._lock:
+           self.samples.clear()
+
+   def count_statement(self, *args):
+       self._local.statements = getattr(self._local, 'statements', 0) + 1
+
+   def request(self, route, call):
+       self._local.statements = 0
+       started = time.perf_counter()
+       response = call()
+       elapsed = time.perf_counter() - started
+       with self._lock:
+           self.samples[route].append((response.status_code, elapsed, self._local.statements))
+       return response
+
+
+def percentile(sorted_values, fraction):
+   if not sorted_values:
+       return None
+   index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+   return sorted_values[index]
+
+
+def summarize(samples, duration):
+   """Latency percentiles (ms), throughput and statements per request for one route"""
+   latencies = sorted(seconds * 1000 for status, seconds, statements in samples)
+   return {
+       'requests': len(samples),
+       'errors': sum(1 for status, seconds, statements in samples if status >= 500),
+       'rejected': sum(1 for status, seconds, statements in samples if 400 <= status < 500),
+       'throughput_rps': round(len(samples) / duration, 2),
+       'latency_ms': {
+           'p50': round(percentile(latencies, 0.50), 2),
+           'p95': round(percentile(latencies, 0.95), 2),
+           'p99': round(percentile(latencies, 0.99), 2),
+           'mean': round(statistics.fmean(latencies), 2),
+           'max': round(latencies[-1], 2)
+       },
+       'queries_per_request': round(statistics.fmean(statements for status, seconds, statements in samples), 2)
+   }
+
+
+class Scenarios:
+   """One method per scenario; each drives a short user flow through the test client"""
+
+   def __init__(self, app, recorder, rng, farmer_tokens, buyer_tokens, animal_ids):
+       self.client = app.test_client()
+       self.recorder = recorder
+       self.rng = rng
+       self.farmer_tokens = farmer_tokens
+       self.buyer_tokens = buyer_tokens
+       self.animal_ids = animal_ids
+
+   def get(self, route, url, token=None):
+       headers = {'Authorization': f'Bearer {token}'} if token else {}
+       return self.recorder.request(route, lambda: self.client.get(url, headers=headers))
+
+   def post(self, route, url, body, token):
+       headers = {'Authorization': f'Bearer {token}'}
+       return self.recorder.request(route, lambda: self.client.post(url, json=body, headers=headers))
+
+   def browse(self):
+       animal_type = self.rng.choice(list(BREEDS))
+       response = self.get('GET /api/animals', f'/api/animals?type={animal_type}&limit=20')
+       cursor = response.headers.get('X-Next-Cursor')
+       if cursor:
+           self.get('GET /api/animals (next page)', f'/api/animals?type={animal_type}&limit=20&cursor={cursor}')
+       self.get('GET /api/animals/facets', f'/api/animals/facets?type={animal_type}')
+       near = self.rng.choice(LOCATIONS).split(',')[0]
+       self.get('GET /api/animals (near)', f'/api/animals?near={near}&radius=100&sort=distance&limit=20')
+
+   def search(self):
+       term = self.rng.choice(SEARCH_TERMS)
+       response = self.get('GET /api/animals (search)', f'/api/animals?search={term}&limit=20')
+       if response.status_code == 200 and response.json:
+           self.get('GET /api/animals/<id>', f"/api/animals/{self.rng.choice(response.json)['id']}")
+
+   def cart(self):
+       token = self.rng.choice(self.buyer_tokens)
+       animal_ids = self.rng.sample(self.animal_ids, min(3, len(self.animal_ids)))
+       self.post('POST /api/cart/batch (add)', '/api/cart/batch',
+                 {'operations': [{'op': 'add', 'animalId': animal_id} for animal_id in animal_ids]}, token)
+       self.get('GET /api/cart', '/api/cart', token)
+       self.post('POST /api/cart/batch (remove)', '/api/cart/batch',
+                 {'operations': [{'op': 'remove', 'animalId': animal_id} for animal_id in animal_ids]}, token)
+
+   def checkout(self):
+       token = self.rng.choice(self.buyer_tokens)
+       animal_id = self.rng.choice(self.animal_ids)
+       self.post('POST /api/orders', '/api/orders', {
+           'items': [{'animalId': animal_id, 'quantity': 1}],
+           'shippingAddress': {'city': 'Bench'},
+           'paymentMethod': 'card'
+       }, token)
+
+   def dashboard(self):
+       token = self.rng.choice(self.farmer_tokens + self.buyer_tokens)
+       self.get('GET /api/dashboard/stats', '/api/dashboard/stats', token)
+       if token in self.farmer_tokens:
+           interval = self.rng.choice(['day', 'week', 'month'])
+           since = (datetime.utcnow() - timedelta(days=365)).date()
+           self.get('GET /api/analytics/sales', f'/api/analytics/sales?from={since}&interval={interval}', token)
+
+   def orders(self):
+       self.get('GET /api/orders (farmer)', '/api/orders?limit=20', self.rng.choice(self.farmer_tokens))
+       self.get('GET /api/orders (buyer)', '/api/orders?limit=20', self.rng.choice(self.buyer_tokens))
+
+
+def parse_mix(text):
+   mix = {}
+   for part in text.split(','):
+       name, _, weight = part.partition('=')
+       if not hasattr(Scenarios, name.strip()):
+           raise argparse.ArgumentTypeError(f'unknown scenario {name!r}')
+       mix[name.strip()] = float(weight or 1)
+   return mix
+
+
+def git_commit():
+   try:
+       return subprocess.run(
+           ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=10
+       ).stdout.strip() or None
+   except OSError:
+       return None
+
+
+def main(argv=None):
+   parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+   parser.add_argument('--database-url', required=True, help='SQLite or PostgreSQL; seeded first when empty')
+   parser.add_argument('--clients', type=int, default=8, help='concurrent client threads')
+   parser.add_argument('--duration', type=float, default=30, help='seconds of measured load')
+   parser.add_argument('--warmup', type=float, default=3, help='seconds of unmeasured load first')
+   parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f'scenario weights (default {DEFAULT_MIX})')
+   parser.add_argument('--users', type=int, default=200, help='farmers and buyers each to sign tokens for')
+   parser.add_argument('--no-cache', action='store_true', help='disable the listing response cache')
+   parser.add_argument('--output', help='results file (default benchmarks/results/<time>-<commit>.json)')
+   add_size_arguments(parser)
+   args = parser.parse_args(argv)
+  
+   # config.py reads the environment at import time, so set it before importing the app
+   os.environ['DATABASE_URL'] = args.database_url
+   if args.no_cache:
+       os.environ['LISTING_CACHE_SIZE'] = '0'
+   import sqlalchemy as sa
+   from flask_jwt_extended import create_access_token
+   from flask_migrate import upgrade
+   from app import create_app, db, User, Animal
+  
+   app = create_app()
+   recorder = Recorder()
+   with app.app_context():
+       upgrade(directory=os.path.join(BACKEND_DIR, 'migrations'))
+       if not User.query.first():
+           seed(args.farmers, args.buyers, args.animals, args.orders, args.seed, args.chunk_size)
+       sizes = {
+           'users': User.query.count(),
+           'animals': Animal.query.count(),
+           'orders': db.session.execute(sa.text('SELECT COUNT(*) FROM orders')).scalar()
+       }
+       farmer_tokens, buyer_tokens = [], []
+       for user_type, tokens in (('farmer', farmer_tokens), ('buyer', buyer_tokens)):
+           user_ids = db.session.scalars(
+               db.select(User.id).where(User.user_type == user_type).order_by(User.id).limit(args.users)
+           )
+           tokens.extend(create_access_token(identity=user_id) for user_id in user_ids)
+       animal_ids = list(db.session.scalars(
+           db.select(Animal.id).where(Animal.status == 'available').order_by(Animal.id).limit(5000)
+       ))
+       sa.event.listen(db.engine, 'before_cursor_execute', recorder.count_statement)
+       dialect = db.engine.dialect.name
+  
+   names = list(args.mix)
+   weights = [args.mix[name] for name in names]
+   stopping = threading.Event()
+
+   def client(index):
+       rng = random.Random(args.seed + index)
+       scenarios = Scenarios(app, recorder, rng, farmer_tokens, buyer_tokens, animal_ids)
+       while not stopping.is_set():
+           getattr(scenarios, rng.choices(names, weights)[0])()
+  
+   threads = [threading.Thread(target=client, args=(index,), daemon=True) for index in range(args.clients)]
+   for thread in threads:
+       thread.start()
+   time.sleep(args.warmup)
+   recorder.reset()
+   started = time.perf_counter()
+   time.sleep(args.duration)
+   stopping.set()
+   duration = time.perf_counter() - started
+   for thread in threads:
+       thread.join()
+  
+   routes = {route: summarize(samples, duration) for route, samples in sorted(recorder.samples.items())}
+   results = {
+       'meta': {
+           'commit': git_commit(),
+           'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+           'database': dialect,
+           'python': platform.python_version(),
+           'clients': args.clients,
+           'duration_s': round(duration, 2),
+           'mix': args.mix,
+           'listing_cache': not args.no_cache,
+           'seed': args.seed,
+           'sizes': sizes
+       },
+       'total': summarize([sample for samples in recorder.samples.values() for sample in samples], duration),
+       'routes': routes
+   }
+  
+   print(f"{'route':<34} {'reqs':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'sql/req':>8} {'5xx':>5}")
+   for route, summary in list(routes.items()) + [('TOTAL', results['total'])]:
+       latency = summary['latency_ms']
+       print(f"{route:<34} {summary['requests']:>7} {summary['throughput_rps']:>8.1f} {latency['p50']:>8.1f} "
+             f"{latency['p95']:>8.1f} {latency['p99']:>8.1f} {summary['queries_per_request']:>8.1f} {summary['errors']:>5}")
+  
+   output = args.output or os.path.join(
+       BACKEND_DIR, 'benchmarks', 'results',
+       f"{datetime.utcnow():%Y%m%dT%H%M%S}-{results['meta']['commit'] or 'local'}.json"
+   )
+   os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+   with open(output, 'w') as f:
+       json.dump(results, f, indent=2)
+   print(f"Results written to {output}")
+   return 1 if results['total']['errors'] else 0
+
+
+if __name__ == '__main__':
+   sys.exit(main())
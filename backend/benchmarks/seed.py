@@ -0,0 +1,203 @@
+"""
+Synthetic marketplace generator
+
+Fills a database with farmers, buyers, animals and orders drawn from a
+seeded random generator, so the same arguments always produce the same
+data. Rows are written with multi-row INSERTs in chunks, then the search
+index and dashboard counters are built the way the app maintains them.
+
+   python -m benchmarks.seed --database-url sqlite:////tmp/farmart.db \
+       --farmers 10000 --buyers 50000 --animals 500000 --orders 1000000
+"""
+
+
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+BREEDS = {
+   'Cattle': ['Holstein', 'Angus', 'Boran', 'Friesian', 'Jersey', 'Hereford', 'Sahiwal'],
+   'Goat': ['Boer', 'Galla', 'Saanen', 'Toggenburg', 'Alpine'],
+   'Sheep': ['Dorper', 'Merino', 'Suffolk', 'Red Maasai'],
+   'Pig': ['Yorkshire', 'Landrace', 'Duroc', 'Hampshire'],
+   'Chicken': ['Rhode Island Red', 'Kienyeji', 'Leghorn', 'Kuroiler', 'Sussex'],
+   'Rabbit': ['New Zealand White', 'California', 'Flemish Giant']
+}
+# (min, max) price and age in years per type
+PRICES = {'Cattle': (800, 6000), 'Goat': (80, 600), 'Sheep': (80, 500), 'Pig': (150, 1200), 'Chicken': (5, 40), 'Rabbit': (10, 60)}
+AGES = {'Cattle': (0.5, 12), 'Goat': (0.3, 8), 'Sheep': (0.3, 8), 'Pig': (0.2, 5), 'Chicken': (0.1, 3), 'Rabbit': (0.1, 4)}
+NAMES = ['Bessie', 'Daisy', 'Rosie', 'Bella', 'Duke', 'Max', 'Wilbur', 'Clucky', 'Nala', 'Zuri', 'Baraka', 'Amani', 'Juma', 'Shadow', 'Pepper']
+TRAITS = ['healthy', 'vaccinated', 'dewormed', 'docile', 'pedigree', 'grass-fed', 'free-range', 'breeding', 'dairy', 'meat', 'hardy', 'young', 'pregnant', 'registered']
+LOCATIONS = [
+   'Nairobi, Kenya', 'Nakuru, Kenya', 'Eldoret, Kenya', 'Kisumu, Kenya', 'Meru, Kenya', 'Nyeri, Kenya', 'Kitale, Kenya',
+   'Narok, Kenya', 'Machakos, Kenya', 'Arusha, Tanzania', 'Kampala, Uganda', 'Texas, USA', 'Iowa, USA', 'Nebraska, USA'
+]
+ORDER_STATUSES = ['pending', 'confirmed', 'shipped', 'completed', 'completed', 'completed', 'cancelled']
+DEFAULT_SIZES = {'farmers': 200, 'buyers': 1000, 'animals': 10000, 'orders': 20000}
+
+
+def make_id(rng):
+   return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def insert_chunks(table, rows, chunk_size):
+   """Insert an iterable of row dicts with one executemany per chunk, committing each chunk"""
+   from app import db
+   chunk = []
+   for row in rows:
+       chunk.append(row)
+       if len(chunk) >= chunk_size:
+           db.session.execute(table.insert(), chunk)
+           db.session.commit()
+           chunk = []
+   if chunk:
+       db.session.execute(table.insert(), chunk)
+       db.session.commit()
+
+
+def seed(farmers, buyers, animals, orders, random_seed=42, chunk_size=5000, log=print):
+   """Generate the marketplace into the current app's database; returns the row counts"""
+   from app import db, User, Animal, Order, OrderItem, get_gazetteer, index_animals_search, rebuild_daily_sales, rebuild_user_stats
+   import geo
+  
+   rng = random.Random(random_seed)
+   now = datetime.utcnow().replace(microsecond=0)
+   gazetteer = get_gazetteer()
+   points = {location: gazetteer.geocode(location) for location in LOCATIONS}
+
+   def users(count, user_type):
+       for index in range(count):
+           location = rng.choice(LOCATIONS)
+           latitude, longitude = points[location]
+           # Jitter farms around the place so radius searches have a spread to sort
+           latitude += rng.uniform(-0.5, 0.5)
+           longitude += rng.uniform(-0.5, 0.5)
+           yield {
+               'id': make_id(rng), 'email': f'{user_type}{index}@{user_type}.bench', 'password_hash': '-',
+               'name': f'{user_type.title()} {index}', 'user_type': user_type, 'phone': f'+2547{index:08d}',
+               'location': location, 'latitude': latitude, 'longitude': longitude,
+               'geo_cell': geo.grid_cell(latitude, longitude), 'is_verified': True,
+               'created_at': now - timedelta(days=rng.randint(0, 730))
+           }
+  
+   started = time.perf_counter()
+   farmer_rows = list(users(farmers, 'farmer'))
+   buyer_rows = list(users(buyers, 'buyer'))
+   insert_chunks(User.__table__, farmer_rows + buyer_rows, chunk_size)
+   log(f"users: {farmers + buyers} in {time.perf_counter() - started:.1f}s")
+  
+   # Enough animals are sold to cover the orders' items; the rest stay for sale
+   started = time.perf_counter()
+   listings = []
+   sold_fraction = min(0.5, orders * 1.5 / max(animals, 1))
+
+   def animal_rows():
+       for index in range(animals):
+           animal_type = rng.choice(list(BREEDS))
+           farmer = rng.choice(farmer_rows)
+           created_at = now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+           row = {
+               'id': make_id(rng), 'name': f'{rng.choice(NAMES)} {index}', 'type': animal_type,
+               'breed': rng.choice(BREEDS[animal_type]),
+               'age': round(rng.uniform(*AGES[animal_type]), 1), 'weight': round(rng.uniform(1, 900), 1),
+               'price': round(rng.uniform(*PRICES[animal_type]), 2),
+               'description': ' '.join(rng.sample(TRAITS, 4)), 'images': [],
+               'status': 'sold' if rng.random() < sold_fraction else 'available',
+               'farmer_id': farmer['id'], 'created_at': created_at, 'updated_at': created_at
+           }
+           listings.append((row['id'], row['name'], animal_type, row['price'], farmer['id'], farmer['name'], row['status']))
+           yield row
+  
+   rows = []
+   for row in animal_rows():
+       rows.append(row)
+       if len(rows) >= chunk_size:
+           insert_chunks(Animal.__table__, rows, chunk_size)
+           index_animals_search([row['id'] for row in rows])
+           db.session.commit()
+           rows = []
+   if rows:
+       insert_chunks(Animal.__table__, rows, chunk_size)
+       index_animals_search([row['id'] for row in rows])
+       db.session.commit()
+   log(f"animals: {animals} in {time.perf_counter() - started:.1f}s")
+  
+   started = time.perf_counter()
+   sold = [listing for listing in listings if listing[6] == 'sold'] or listings
+   item_rows = []
+
+   def order_rows():
+       for index in range(orders):
+           order_id = make_id(rng)
+           created_at = now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+           total = 0
+           for animal_id, name, animal_type, price, farmer_id, farmer_name, status in rng.sample(sold, min(rng.randint(1, 3), len(sold))):
+               quantity = rng.randint(1, 2)
+               total += price * quantity
+               item_rows.append({
+                   'id': make_id(rng), 'order_id': order_id, 'animal_id': animal_id, 'animal_name': name,
+                   'animal_type': animal_type, 'quantity': quantity, 'price': price, 'farmer_id': farmer_id, 'farmer_name': farmer_name
+               })
+           yield {
+               'id': order_id, 'user_id': rng.choice(buyer_rows)['id'], 'total_amount': round(total, 2),
+               'status': rng.choice(ORDER_STATUSES), 'shipping_address': {'city': 'Bench'},
+               'payment_method': 'card', 'payment_status': 'paid', 'created_at': created_at, 'updated_at': created_at
+           }
+  
+   rows = []
+   for row in order_rows():
+       rows.append(row)
+       if len(rows) >= chunk_size:
+           insert_chunks(Order.__table__, rows, chunk_size)
+           insert_chunks(OrderItem.__table__, item_rows, chunk_size)
+           rows, item_rows[:] = [], []
+   if rows:
+       insert_chunks(Order.__table__, rows, chunk_size)
+       insert_chunks(OrderItem.__table__, item_rows, chunk_size)
+   log(f"orders: {orders} in {time.perf_counter() - started:.1f}s")
+  
+   started = time.perf_counter()
+   rebuild_user_stats()
+   rebuild_daily_sales()
+   log(f"dashboard counters and sales rollup in {time.perf_counter() - started:.1f}s")
+   return {'farmers': farmers, 'buyers': buyers, 'animals': animals, 'orders': orders}
+
+
+def add_size_arguments(parser):
+   for name, default in DEFAULT_SIZES.items():
+       parser.add_argument(f'--{name}', type=int, default=default, help=f'number of {name} (default {default})')
+   parser.add_argument('--seed', type=int, default=42, help='random seed; the same seed gives the same data')
+   parser.add_argument('--chunk-size', type=int, default=5000, help='rows per INSERT batch')
+
+
+def main(argv=None):
+   parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+   parser.add_argument('--database-url', required=True, help='an empty SQLite or PostgreSQL database')
+   add_size_arguments(parser)
+   args = parser.parse_args(argv)
+  
+   # config.py reads the environment at import time, so set it before importing the app
+   os.environ['DATABASE_URL'] = args.database_url
+   from flask_migrate import upgrade
+   from app import create_app, User
+  
+   app = create_app()
+   with app.app_context():
+       upgrade(directory=os.path.join(BACKEND_DIR, 'migrations'))
+       if User.query.first():
+           print("FAIL: database already has users; seed into an empty database")
+           return 1
+       seed(args.farmers, args.buyers, args.animals, args.orders, args.seed, args.chunk_size)
+   return 0
+
+
+if __name__ == '__main__':
+   sys.exit(main())
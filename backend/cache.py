@@ -0,0 +1,55 @@
+"""
+In-process caches shared by the API handlers
+"""
+
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+   """Bounded, thread-safe LRU cache whose entries also expire after a TTL.
+
+   The TTL bounds staleness across gunicorn workers; writes in the same
+   process call pop() or clear() so their own reads are never stale.
+   """
+
+   def __init__(self, max_entries=512, ttl=30):
+       self.max_entries = max_entries
+       self.ttl = ttl
+       # time.monotonic() of the last clear(), None until then
+       self.cleared_at = None
+       self._entries = OrderedDict()
+       self._lock = threading.Lock()
+
+   def get(self, key):
+       with self._lock:
+           entry = self._entries.get(key)
+           if entry is None:
+               return None
+           expires_at, value = entry
+           if expires_at < time.monotonic():
+               del self._entries[key]
+               return None
+           self._entries.move_to_end(key)
+           return value
+
+   def set(self, key, value):
+       with self._lock:
+           self._entries[key] = (time.monotonic() + self.ttl, value)
+           self._entries.move_to_end(key)
+           while len(self._entries) > self.max_entries:
+               self._entries.popitem(last=False)
+
+   def pop(self, key):
+       with self._lock:
+           self._entries.pop(key, None)
+
+   def clear(self):
+       with self._lock:
+           self._entries.clear()
+           self.cleared_at = time.monotonic()
+
+   def __len__(self):
+       return len(self._entries)
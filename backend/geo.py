@@ -0,0 +1,92 @@
+"""
+Offline geocoding and the spatial grid used for "near me" searches
+
+Free-text locations are resolved against a CSV gazetteer shipped with the
+app (name, region, country, latitude, longitude), so geocoding never makes a
+network call. Coordinates are bucketed into fixed-size grid cells; a radius
+search turns its bounding box into a short list of cell ids that an ordinary
+B-tree index can answer on every database.
+"""
+
+
+import csv
+import math
+import re
+
+
+KM_PER_DEGREE = 111.195
+# Grid cell size in degrees (about 111 km of latitude)
+CELL_SIZE = 1.0
+CELLS_PER_ROW = int(360 / CELL_SIZE)
+# Past this many cells a radius search filters on the bounding box alone
+MAX_SEARCH_CELLS = 400
+
+
+def normalize(text):
+   return re.sub(r'[^a-z0-9]+', ' ', text.lower()).strip()
+
+
+class Gazetteer:
+   """Place-name lookup over a CSV file, earlier rows winning ties"""
+
+   def __init__(self, path):
+       self._places = {}
+       with open(path, newline='', encoding='utf-8') as f:
+           for row in csv.DictReader(f):
+               place = (
+                   normalize(row['region']),
+                   normalize(row['country']),
+                   float(row['latitude']),
+                   float(row['longitude'])
+               )
+               self._places.setdefault(normalize(row['name']), []).append(place)
+
+   def geocode(self, location):
+       """Return (latitude, longitude) for free text such as 'Nakuru, Kenya', or None.
+
+       The most specific comma-separated part that names a known place wins;
+       the remaining parts pick between places sharing that name.
+       """
+       parts = [normalize(part) for part in (location or '').split(',')]
+       parts = [part for part in parts if part]
+       for part in parts:
+           places = self._places.get(part)
+           if not places:
+               continue
+           context = set(parts) - {part}
+           region, country, latitude, longitude = next(
+               (place for place in places if context & {place[0], place[1]}), places[0]
+           )
+           return latitude, longitude
+       return None
+
+
+def grid_cell(latitude, longitude):
+   """Integer id of the grid cell containing a point"""
+   row = min(int((latitude + 90) // CELL_SIZE), int(180 / CELL_SIZE) - 1)
+   column = min(int((longitude + 180) // CELL_SIZE), CELLS_PER_ROW - 1)
+   return row * CELLS_PER_ROW + column
+
+
+def bounding_box(latitude, longitude, radius_km):
+   """(min_lat, max_lat, min_lon, max_lon) enclosing a circle; longitudes do not wrap at 180"""
+   lat_delta = radius_km / KM_PER_DEGREE
+   lon_delta = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+   return (
+       max(latitude - lat_delta, -90.0), min(latitude + lat_delta, 90.0),
+       max(longitude - lon_delta, -180.0), min(longitude + lon_delta, 180.0)
+   )
+
+
+def cells_in_box(min_lat, max_lat, min_lon, max_lon):
+   """Grid cell ids overlapping a bounding box, or None when there are too many to list"""
+   first, last = grid_cell(min_lat, min_lon), grid_cell(max_lat, max_lon)
+   first_row, first_column = divmod(first, CELLS_PER_ROW)
+   last_row, last_column = divmod(last, CELLS_PER_ROW)
+   if (last_row - first_row + 1) * (last_column - first_column + 1) > MAX_SEARCH_CELLS:
+       return None
+   return [
+       row * CELLS_PER_ROW + column
+       for row in range(first_row, last_row + 1)
+       for column in range(first_column, last_column + 1)
+   ]
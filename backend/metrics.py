@@ -0,0 +1,136 @@
+"""
+Process-local metrics rendered in the Prometheus text exposition format
+
+Each gunicorn worker keeps its own counters, so scrape every worker (or
+aggregate them in Prometheus with sum by the labels you care about).
+"""
+
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Seconds; covers fast cached reads through slow exports and external calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+   return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+   pairs = list(zip(names, values)) + list(extra)
+   if not pairs:
+       return ''
+   return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+   return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+   def __init__(self, name, documentation, labelnames=()):
+       self.name = name
+       self.documentation = documentation
+       self.labelnames = tuple(labelnames)
+       self._values = {}
+       self._lock = threading.Lock()
+
+   def inc(self, amount=1, **labels):
+       key = tuple(labels[name] for name in self.labelnames)
+       with self._lock:
+           self._values[key] = self._values.get(key, 0) + amount
+
+   def render(self):
+       lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+       with self._lock:
+           for key, value in sorted(self._values.items()):
+               lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+       return lines
+
+
+class Gauge:
+   """A value read at scrape time from collect(), a callable returning {label values: value}"""
+
+   def __init__(self, name, documentation, labelnames=(), collect=None):
+       self.name = name
+       self.documentation = documentation
+       self.labelnames = tuple(labelnames)
+       self.collect = collect
+
+   def render(self):
+       lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+       for key, value in sorted(self.collect().items()):
+           lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+       return lines
+
+
+class Histogram:
+   def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+       self.name = name
+       self.documentation = documentation
+       self.labelnames = tuple(labelnames)
+       self.buckets = tuple(sorted(buckets))
+       self._series = {}
+       self._lock = threading.Lock()
+
+   def observe(self, value, **labels):
+       key = tuple(labels[name] for name in self.labelnames)
+       with self._lock:
+           series = self._series.get(key)
+           if series is None:
+               # [per-bucket counts, sum, observation count]
+               series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+           for index, bound in enumerate(self.buckets):
+               if value <= bound:
+                   series[0][index] += 1
+           series[1] += value
+           series[2] += 1
+
+   @contextmanager
+   def time(self, **labels):
+       started = time.perf_counter()
+       try:
+           yield
+       finally:
+           self.observe(time.perf_counter() - started, **labels)
+
+   def render(self):
+       lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+       with self._lock:
+           for key, (counts, total, observations) in sorted(self._series.items()):
+               for bound, count in zip(self.buckets, counts):
+                   labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                   lines.append(f'{self.name}_bucket{labels} {count}')
+               lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, [("le", "+Inf")])} {observations}')
+               lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {total!r}')
+               lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {observations}')
+       return lines
+
+
+class Registry:
+   def __init__(self):
+       self._metrics = []
+
+   def counter(self, *args, **kwargs):
+       metric = Counter(*args, **kwargs)
+       self._metrics.append(metric)
+       return metric
+
+   def gauge(self, *args, **kwargs):
+       metric = Gauge(*args, **kwargs)
+       self._metrics.append(metric)
+       return metric
+
+   def histogram(self, *args, **kwargs):
+       metric = Histogram(*args, **kwargs)
+       self._metrics.append(metric)
+       return metric
+
+   def render(self):
+       lines = []
+       for metric in self._metrics:
+           lines.extend(metric.render())
+       return '\n'.join(lines) + '\n'
@@ -0,0 +1,37 @@
+"""Image deletion queue
+
+Revision ID: 1e8f4b2c7d90
+Revises: c4b19e7f3a62
+Create Date: 2026-10-17 17:21:09.384615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1e8f4b2c7d90'
+down_revision = 'c4b19e7f3a62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('image_deletions',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('public_id', sa.String(length=255), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('deleted_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('public_id')
+    )
+    op.create_index('ix_image_deletions_status_next_attempt_at', 'image_deletions', ['status', 'next_attempt_at'])
+
+
+def downgrade():
+    op.drop_index('ix_image_deletions_status_next_attempt_at', table_name='image_deletions')
+    op.drop_table('image_deletions')
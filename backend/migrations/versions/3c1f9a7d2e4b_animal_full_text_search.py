@@ -0,0 +1,50 @@
+"""Animal full-text search index
+
+Revision ID: 3c1f9a7d2e4b
+Revises: 6507708f2b03
+Create Date: 2026-10-17 09:12:44.201377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f9a7d2e4b'
+down_revision = '6507708f2b03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute('ALTER TABLE animals ADD COLUMN search_vector tsvector')
+        op.execute("""
+            UPDATE animals SET search_vector =
+                setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(type, '') || ' ' || coalesce(breed, '')), 'B') ||
+                setweight(to_tsvector('english', coalesce(description, '')), 'C')
+        """)
+        op.create_index('ix_animals_search_vector', 'animals', ['search_vector'], postgresql_using='gin')
+    elif dialect == 'sqlite':
+        op.execute("""
+            CREATE VIRTUAL TABLE animals_fts USING fts5(
+                animal_id UNINDEXED, name, type, breed, description
+            )
+        """)
+        op.execute("""
+            INSERT INTO animals_fts (animal_id, name, type, breed, description)
+            SELECT id, name, type, breed, description FROM animals
+        """)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.drop_index('ix_animals_search_vector', table_name='animals')
+        op.drop_column('animals', 'search_vector')
+    elif dialect == 'sqlite':
+        op.execute('DROP TABLE animals_fts')
@@ -0,0 +1,43 @@
+"""Daily sales rollup
+
+Revision ID: 4a9c2e7b1d53
+Revises: 8f3d6a1b5e24
+Create Date: 2026-10-17 21:14:08.317542
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a9c2e7b1d53'
+down_revision = '8f3d6a1b5e24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('order_items', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('animal_type', sa.String(length=50), nullable=True))
+    # Snapshot the type of already-ordered animals, as new orders do at checkout
+    op.execute(
+        "UPDATE order_items SET animal_type = "
+        "(SELECT animals.type FROM animals WHERE animals.id = order_items.animal_id)"
+    )
+
+    # Filled from completed orders with `flask rebuild-sales-rollup`, then kept current on status changes
+    op.create_table('farmer_daily_sales',
+    sa.Column('farmer_id', sa.String(length=36), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('animal_type', sa.String(length=50), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('farmer_id', 'day', 'animal_type')
+    )
+
+
+def downgrade():
+    op.drop_table('farmer_daily_sales')
+    with op.batch_alter_table('order_items', schema=None) as batch_op:
+        batch_op.drop_column('animal_type')
@@ -0,0 +1,38 @@
+"""Dashboard counters table
+
+Revision ID: 5d8c3b6a9f17
+Revises: e2a57c9f1d38
+Create Date: 2026-10-17 13:25:51.092634
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8c3b6a9f17'
+down_revision = 'e2a57c9f1d38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Rows are created lazily on first use; run `flask rebuild-stats` to backfill eagerly
+    op.create_table('user_stats',
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('total_animals', sa.Integer(), nullable=False),
+    sa.Column('available_animals', sa.Integer(), nullable=False),
+    sa.Column('sold_animals', sa.Integer(), nullable=False),
+    sa.Column('total_revenue', sa.Float(), nullable=False),
+    sa.Column('pending_orders', sa.Integer(), nullable=False),
+    sa.Column('cart_items', sa.Integer(), nullable=False),
+    sa.Column('total_orders', sa.Integer(), nullable=False),
+    sa.Column('total_spent', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('user_stats')
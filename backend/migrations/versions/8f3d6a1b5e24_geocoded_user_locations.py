@@ -0,0 +1,34 @@
+"""Geocoded user locations
+
+Revision ID: 8f3d6a1b5e24
+Revises: 1e8f4b2c7d90
+Create Date: 2026-10-17 18:05:52.640173
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f3d6a1b5e24'
+down_revision = '1e8f4b2c7d90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('geo_cell', sa.Integer(), nullable=True))
+    # Radius searches look farms up by grid cell; fill the columns with `flask geocode-users`
+    op.create_index('ix_users_geo_cell', 'users', ['geo_cell'])
+
+
+def downgrade():
+    op.drop_index('ix_users_geo_cell', table_name='users')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('geo_cell')
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
+
@@ -0,0 +1,63 @@
+"""Indexes for listing, cart, order and dashboard queries
+
+Revision ID: 9b4e2d81c0a5
+Revises: 3c1f9a7d2e4b
+Create Date: 2026-10-17 10:03:27.518840
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b4e2d81c0a5'
+down_revision = '3c1f9a7d2e4b'
+branch_labels = None
+depends_on = None
+
+
+def merge_duplicate_cart_items():
+    """Fold duplicate (user_id, animal_id) cart rows into one before adding the unique constraint"""
+    bind = op.get_bind()
+    duplicates = bind.execute(sa.text("""
+        SELECT user_id, animal_id, MIN(id) AS keep_id, SUM(COALESCE(quantity, 1)) AS quantity
+        FROM cart_items
+        GROUP BY user_id, animal_id
+        HAVING COUNT(*) > 1
+    """)).fetchall()
+    for user_id, animal_id, keep_id, quantity in duplicates:
+        params = {'user_id': user_id, 'animal_id': animal_id, 'keep_id': keep_id, 'quantity': quantity}
+        bind.execute(sa.text("""
+            DELETE FROM cart_items
+            WHERE user_id = :user_id AND animal_id = :animal_id AND id != :keep_id
+        """), params)
+        bind.execute(sa.text('UPDATE cart_items SET quantity = :quantity WHERE id = :keep_id'), params)
+
+
+def upgrade():
+    # get_animals: status = 'available' ORDER BY created_at DESC, id DESC
+    op.create_index('ix_animals_status_created_at', 'animals', ['status', 'created_at', 'id'])
+    # farmer listings and dashboard counts: farmer_id = ? [AND status = ?]
+    op.create_index('ix_animals_farmer_id_status', 'animals', ['farmer_id', 'status'])
+
+    # get_cart by user_id, add_to_cart duplicate check by (user_id, animal_id)
+    merge_duplicate_cart_items()
+    with op.batch_alter_table('cart_items') as batch_op:
+        batch_op.create_unique_constraint('uq_cart_items_user_id_animal_id', ['user_id', 'animal_id'])
+
+    # order items loaded per order, and farmer order/revenue lookups joining back to orders
+    op.create_index('ix_order_items_order_id', 'order_items', ['order_id'])
+    op.create_index('ix_order_items_farmer_id_order_id', 'order_items', ['farmer_id', 'order_id'])
+
+    # buyer order history and dashboard: user_id = ? ORDER BY created_at DESC
+    op.create_index('ix_orders_user_id_created_at', 'orders', ['user_id', 'created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_orders_user_id_created_at', table_name='orders')
+    op.drop_index('ix_order_items_farmer_id_order_id', table_name='order_items')
+    op.drop_index('ix_order_items_order_id', table_name='order_items')
+    with op.batch_alter_table('cart_items') as batch_op:
+        batch_op.drop_constraint('uq_cart_items_user_id_animal_id', type_='unique')
+    op.drop_index('ix_animals_farmer_id_status', table_name='animals')
+    op.drop_index('ix_animals_status_created_at', table_name='animals')
@@ -0,0 +1,36 @@
+"""Cart reservations
+
+Revision ID: a7e06f4d2c91
+Revises: 5d8c3b6a9f17
+Create Date: 2026-10-17 15:02:19.440581
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7e06f4d2c91'
+down_revision = '5d8c3b6a9f17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('reservations',
+    sa.Column('animal_id', sa.String(length=36), nullable=False),
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['animal_id'], ['animals.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('animal_id')
+    )
+    op.create_index('ix_reservations_expires_at', 'reservations', ['expires_at'])
+    op.create_index('ix_reservations_user_id', 'reservations', ['user_id'])
+
+
+def downgrade():
+    op.drop_index('ix_reservations_user_id', table_name='reservations')
+    op.drop_index('ix_reservations_expires_at', table_name='reservations')
+    op.drop_table('reservations')
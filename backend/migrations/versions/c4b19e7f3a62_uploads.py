@@ -0,0 +1,38 @@
+"""Signed image uploads
+
+Revision ID: c4b19e7f3a62
+Revises: a7e06f4d2c91
+Create Date: 2026-10-17 16:48:36.117904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4b19e7f3a62'
+down_revision = 'a7e06f4d2c91'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('uploads',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('public_id', sa.String(length=255), nullable=False),
+    sa.Column('url', sa.String(length=500), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('confirmed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('public_id')
+    )
+    op.create_index(op.f('ix_uploads_user_id'), 'uploads', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_uploads_user_id'), table_name='uploads')
+    op.drop_table('uploads')
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Farmart Email Outbox Worker
+Run this alongside the web process to deliver emails queued by the API,
+delete stored images queued by listing edits and deletions, and periodically
+garbage-collect uploads that never made it onto a listing
+"""
+
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from flask import current_app
+
+import sqlalchemy as sa
+
+from app import create_app, db, EmailOutbox, ImageDeletion, Upload, send_email, get_storage, collect_orphaned_images, external_call, external_services, metrics_registry
+from resilience import ServiceUnavailableError
+
+
+BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 50))
+POOL_SIZE = int(os.getenv('OUTBOX_POOL_SIZE', 8))
+POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 2))
+MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8))
+BASE_BACKOFF = timedelta(seconds=30)
+MAX_BACKOFF = timedelta(hours=1)
+# How long a claimed message stays invisible to other workers before it is retried
+CLAIM_LEASE = timedelta(minutes=5)
+# Seconds between orphaned upload scans
+ORPHAN_GC_INTERVAL = float(os.getenv('ORPHAN_GC_INTERVAL', 3600))
+# When set, SendGrid and Cloudinary call metrics are served on this port at /metrics
+METRICS_PORT = int(os.getenv('OUTBOX_METRICS_PORT', 0))
+# deliver()'s result for a send the SendGrid guard turned away before it was attempted
+REJECTED = object()
+
+
+def claim_batch(limit=BATCH_SIZE):
+   """Lease a batch of due messages to this worker and commit the claim"""
+   now = datetime.utcnow()
+   messages = EmailOutbox.query.filter(
+       EmailOutbox.status.in_(['pending', 'sending']),
+       EmailOutbox.next_attempt_at <= now
+   ).order_by(EmailOutbox.next_attempt_at).limit(limit).with_for_update(skip_locked=True).all()
+  
+   for message in messages:
+       message.status = 'sending'
+       message.attempts = (message.attempts or 0) + 1
+       message.next_attempt_at = now + CLAIM_LEASE
+   db.session.commit()
+   return messages
+
+
+def deliver(app, message):
+   """Send one message from a pool thread, returning None on success, REJECTED when the
+   call never reached SendGrid, or the error text"""
+   try:
+       with app.app_context():
+           send_email(message['to_email'], message['subject'], message['html_content'])
+       return None
+   except ServiceUnavailableError:
+       return REJECTED
+   except Exception as e:
+       return str(e) or e.__class__.__name__
+
+
+def backoff(attempts):
+   return min(BASE_BACKOFF * 2 ** (attempts - 1), MAX_BACKOFF)
+
+
+def release_claim(row, now):
+   """Hand back a claimed row that was never attempted, without spending an attempt"""
+   row.status = 'pending'
+   row.attempts -= 1
+   row.next_attempt_at = now
+
+
+def process_batch(executor):
+   """Deliver one batch through the worker pool and record the outcomes; returns the batch size"""
+   if not external_services['sendgrid'].accepting:
+       # Leave the messages queued until the circuit is due for a probe
+       return 0
+   messages = claim_batch()
+   if not messages:
+       return 0
+  
+   # Workers only see plain dicts so no ORM state crosses threads
+   payloads = [
+       {'to_email': m.to_email, 'subject': m.subject, 'html_content': m.html_content}
+       for m in messages
+   ]
+   app = current_app._get_current_object()
+   errors = list(executor.map(lambda payload: deliver(app, payload), payloads))
+  
+   now = datetime.utcnow()
+   for message, error in zip(messages, errors):
+       if error is REJECTED:
+           release_claim(message, now)
+       elif error is None:
+           message.status = 'sent'
+           message.sent_at = now
+           message.last_error = None
+       elif message.attempts >= MAX_ATTEMPTS:
+           message.status = 'failed'
+           message.last_error = error
+       else:
+           message.status = 'pending'
+           message.last_error = error
+           message.next_attempt_at = now + backoff(message.attempts)
+   db.session.commit()
+   return len(messages)
+
+
+def claim_deletions(limit):
+   """Lease a batch of due image deletions to this worker and commit the claim"""
+   now = datetime.utcnow()
+   deletions = ImageDeletion.query.filter(
+       ImageDeletion.status.in_(['pending', 'deleting']),
+       ImageDeletion.next_attempt_at <= now
+   ).order_by(ImageDeletion.next_attempt_at).limit(limit).with_for_update(skip_locked=True).all()
+  
+   for deletion in deletions:
+       deletion.status = 'deleting'
+       deletion.attempts = (deletion.attempts or 0) + 1
+       deletion.next_attempt_at = now + CLAIM_LEASE
+   db.session.commit()
+   return deletions
+
+
+def process_deletions():
+   """Delete one batch of images with a single storage call; returns the batch size"""
+   storage = get_storage()
+   service = external_services.get(storage.name)
+   if service is not None and not service.accepting:
+       return 0
+   deletions = claim_deletions(storage.DELETE_BATCH_SIZE)
+   if not deletions:
+       return 0
+  
+   public_ids = [deletion.public_id for deletion in deletions]
+   try:
+       with external_call(storage.name, 'delete_resources'):
+           errors = storage.delete_many(public_ids)
+   except ServiceUnavailableError:
+       now = datetime.utcnow()
+       for deletion in deletions:
+           release_claim(deletion, now)
+       db.session.commit()
+       return 0
+   except Exception as e:
+       errors = dict.fromkeys(public_ids, str(e) or e.__class__.__name__)
+  
+   now = datetime.utcnow()
+   for deletion in deletions:
+       error = errors.get(deletion.public_id)
+       if error is None:
+           deletion.status = 'deleted'
+           deletion.deleted_at = now
+           deletion.last_error = None
+       elif deletion.attempts >= MAX_ATTEMPTS:
+           deletion.status = 'failed'
+           deletion.last_error = error
+       else:
+           deletion.status = 'pending'
+           deletion.last_error = error
+           deletion.next_attempt_at = now + backoff(deletion.attempts)
+  
+   deleted = [public_id for public_id in public_ids if public_id not in errors]
+   if deleted:
+       db.session.execute(
+           sa.update(Upload).where(Upload.public_id.in_(deleted)).values(status='deleted')
+           .execution_options(synchronize_session=False)
+       )
+   db.session.commit()
+   return len(deletions)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+   def do_GET(self):
+       if self.path != '/metrics':
+           self.send_error(404)
+           return
+       body = metrics_registry.render().encode()
+       self.send_response(200)
+       self.send_header('Content-Type', 'text/plain; version=0.0.4')
+       self.send_header('Content-Length', str(len(body)))
+       self.end_headers()
+       self.wfile.write(body)
+
+   def log_message(self, format, *args):
+       pass
+
+
+def serve_metrics(port):
+   server = ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+   threading.Thread(target=server.serve_forever, daemon=True).start()
+   return server
+
+
+def run():
+   app = create_app()
+   if METRICS_PORT:
+       serve_metrics(METRICS_PORT)
+   next_gc = time.monotonic()
+   # More send threads than the SendGrid bulkhead admits would only queue on it
+   with ThreadPoolExecutor(max_workers=min(POOL_SIZE, app.config['SENDGRID_MAX_CONCURRENCY'])) as executor:
+       while True:
+           with app.app_context():
+               if time.monotonic() >= next_gc:
+                   collect_orphaned_images()
+                   next_gc = time.monotonic() + ORPHAN_GC_INTERVAL
+               delivered = process_batch(executor)
+               deleted = process_deletions()
+           if delivered < BATCH_SIZE and not deleted:
+               time.sleep(POLL_INTERVAL)
+
+
+if __name__ == '__main__':
+   run()
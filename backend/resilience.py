@@ -0,0 +1,131 @@
+"""
+Guards around calls to external providers (Cloudinary, SendGrid)
+
+Each provider gets a bulkhead, a cap on concurrent calls per process, so a
+slow provider can hold at most that many threads, and a circuit breaker
+that stops calling a provider after consecutive failures and lets a single
+probe through once its reset timeout has passed. Timeouts themselves are set
+on each provider's client; these guards bound what a slow or failing
+provider can cost the rest of the app.
+"""
+
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ServiceUnavailableError(Exception):
+   """A call was turned away without reaching the provider"""
+
+   def __init__(self, service, reason):
+       super().__init__(f'{service} unavailable ({reason})')
+       self.service = service
+       self.reason = reason
+
+
+class CircuitBreaker:
+   CLOSED = 'closed'
+   HALF_OPEN = 'half_open'
+   OPEN = 'open'
+
+   def __init__(self, failure_threshold=5, reset_timeout=30):
+       self.failure_threshold = failure_threshold
+       self.reset_timeout = reset_timeout
+       self.failures = 0
+       self._opened_at = None
+       self._probing = False
+       self._lock = threading.Lock()
+
+   @property
+   def state(self):
+       if self._opened_at is None:
+           return self.CLOSED
+       if self._probing or time.monotonic() - self._opened_at >= self.reset_timeout:
+           return self.HALF_OPEN
+       return self.OPEN
+
+   def allow(self):
+       """Whether a call may go ahead; while half open only one probe at a time does"""
+       with self._lock:
+           state = self.state
+           if state == self.CLOSED:
+               return True
+           if state == self.HALF_OPEN and not self._probing:
+               self._probing = True
+               return True
+           return False
+
+   def record_success(self):
+       with self._lock:
+           self.failures = 0
+           self._opened_at = None
+           self._probing = False
+
+   def record_failure(self):
+       with self._lock:
+           self.failures += 1
+           if self._probing or self.failures >= self.failure_threshold:
+               self._opened_at = time.monotonic()
+               self._probing = False
+
+
+class Bulkhead:
+   """Concurrency limit; callers wait up to max_wait seconds for a free slot"""
+
+   def __init__(self, max_concurrent=4, max_wait=0):
+       self.max_concurrent = max_concurrent
+       self.max_wait = max_wait
+       self.in_flight = 0
+       self._condition = threading.Condition()
+
+   def acquire(self):
+       with self._condition:
+           if not self._condition.wait_for(lambda: self.in_flight < self.max_concurrent, timeout=self.max_wait):
+               return False
+           self.in_flight += 1
+           return True
+
+   def release(self):
+       with self._condition:
+           self.in_flight -= 1
+           self._condition.notify()
+
+
+class ExternalService:
+   """Bulkhead and circuit breaker for one provider.
+
+   is_failure decides which exceptions count against the provider's health;
+   by default all of them do.
+   """
+
+   def __init__(self, name, is_failure=None):
+       self.name = name
+       self.bulkhead = Bulkhead()
+       self.breaker = CircuitBreaker()
+       self.is_failure = is_failure or (lambda e: True)
+
+   @property
+   def accepting(self):
+       """False while the breaker is open and not yet due for a probe"""
+       return self.breaker.state != CircuitBreaker.OPEN
+
+   @contextmanager
+   def guard(self):
+       """Run the enclosed call under the bulkhead and breaker; raises ServiceUnavailableError"""
+       if not self.bulkhead.acquire():
+           raise ServiceUnavailableError(self.name, 'bulkhead_full')
+       try:
+           if not self.breaker.allow():
+               raise ServiceUnavailableError(self.name, 'circuit_open')
+           try:
+               yield
+           except Exception as e:
+               if self.is_failure(e):
+                   self.breaker.record_failure()
+               else:
+                   self.breaker.record_success()
+               raise
+           self.breaker.record_success()
+       finally:
+           self.bulkhead.release()
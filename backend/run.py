@@ -5,7 +5,10 @@ Run this file to start the Flask development server
 """
 
 
-from app import app
+from app import create_app
+
+
+app = create_app()
 
 
 if __name__ == '__main__':
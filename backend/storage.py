@@ -0,0 +1,152 @@
+"""
+Image storage backends for direct-to-storage uploads
+
+The API never handles image bytes: it signs an upload for a public id, the
+client sends the file straight to the backend, and the API then confirms
+the backend's response before recording the URL. CloudinaryStorage talks
+to Cloudinary; LocalStorage implements the same interface on local disk so
+the flow can be exercised offline.
+"""
+
+
+import hashlib
+import hmac
+import os
+import time
+
+import cloudinary.api
+import cloudinary.uploader
+import cloudinary.utils
+
+
+class UploadVerificationError(Exception):
+   """The client's upload result could not be verified with the storage backend"""
+
+
+class CloudinaryStorage:
+   name = 'cloudinary'
+   # Same eager transformation the server-side upload applied
+   TRANSFORMATION = 'c_fill,h_600,w_800/q_auto/f_auto'
+   # Most public ids the Admin API deletes in one call
+   DELETE_BATCH_SIZE = 100
+
+   def __init__(self, cloud_name, api_key, api_secret, api_host='https://api.cloudinary.com', timeout=None):
+       self.cloud_name = cloud_name
+       self.api_key = api_key
+       self.api_secret = api_secret
+       self.api_host = api_host.rstrip('/')
+       self.timeout = timeout
+
+   def _options(self):
+       options = dict(api_key=self.api_key, api_secret=self.api_secret, cloud_name=self.cloud_name, upload_prefix=self.api_host)
+       if self.timeout is not None:
+           options['timeout'] = self.timeout
+       return options
+
+   def sign_upload(self, public_id, expires_in):
+       """Return (upload_url, form_fields) for a direct browser upload of one image"""
+       params = {
+           'public_id': public_id,
+           'timestamp': int(time.time()),
+           'transformation': self.TRANSFORMATION
+       }
+       fields = dict(params, api_key=self.api_key, signature=cloudinary.utils.api_sign_request(params, self.api_secret))
+       upload_url = f"{self.api_host}/v1_1/{self.cloud_name}/image/upload"
+       return upload_url, fields
+
+   def confirm_upload(self, public_id, result):
+       """Check Cloudinary's signed upload response and return the image URL"""
+       expected = cloudinary.utils.api_sign_request(
+           {'public_id': public_id, 'version': result.get('version')}, self.api_secret
+       )
+       if result.get('public_id') != public_id or not hmac.compare_digest(expected, str(result.get('signature', ''))):
+           raise UploadVerificationError('Upload signature does not match')
+       # Only the public id and version are signed, so build the URL from them
+       # rather than trusting the secure_url the client passed along
+       url, _ = cloudinary.utils.cloudinary_url(
+           public_id, version=result['version'], secure=True, cloud_name=self.cloud_name
+       )
+       return url
+
+   def delete(self, public_id):
+       cloudinary.uploader.destroy(public_id, **self._options())
+
+   def delete_many(self, public_ids):
+       """Delete up to DELETE_BATCH_SIZE images in one Admin API call.
+
+       Returns {public_id: error} for the ids that were not removed; an id
+       that no longer exists counts as deleted.
+       """
+       result = cloudinary.api.delete_resources(list(public_ids), **self._options())
+       deleted = result.get('deleted', {})
+       return {
+           public_id: deleted.get(public_id) or 'missing from delete response'
+           for public_id in public_ids
+           if deleted.get(public_id) not in ('deleted', 'not_found')
+       }
+
+
+class LocalStorage:
+   """Stores images under a local directory and serves them from base_url"""
+   name = 'local'
+   DELETE_BATCH_SIZE = 100
+
+   def __init__(self, root, base_url, secret):
+       self.root = root
+       self.base_url = base_url.rstrip('/')
+       self.secret = secret.encode()
+
+   def _sign(self, *parts):
+       return hmac.new(self.secret, '|'.join(map(str, parts)).encode(), hashlib.sha256).hexdigest()
+
+   def _path(self, public_id):
+       path = os.path.abspath(os.path.join(self.root, public_id))
+       if not path.startswith(os.path.abspath(self.root) + os.sep):
+           raise UploadVerificationError('Invalid public id')
+       return path
+
+   def sign_upload(self, public_id, expires_in):
+       expires = int(time.time()) + expires_in
+       fields = {'public_id': public_id, 'expires': expires, 'signature': self._sign('upload', public_id, expires)}
+       return f"{self.base_url}/upload", fields
+
+   def accept_upload(self, fields, file):
+       """Store a file sent to the upload URL; plays the storage provider's part of the flow"""
+       public_id = fields.get('public_id', '')
+       expires = fields.get('expires', '')
+       if not hmac.compare_digest(self._sign('upload', public_id, expires), fields.get('signature', '')):
+           raise UploadVerificationError('Invalid upload signature')
+       if int(expires) < time.time():
+           raise UploadVerificationError('Upload signature has expired')
+
+       path = self._path(public_id)
+       os.makedirs(os.path.dirname(path), exist_ok=True)
+       file.save(path)
+       return {
+           'public_id': public_id,
+           'secure_url': f"{self.base_url}/{public_id}",
+           'signature': self._sign('stored', public_id)
+       }
+
+   def confirm_upload(self, public_id, result):
+       signature = str(result.get('signature', ''))
+       if result.get('public_id') != public_id or not hmac.compare_digest(self._sign('stored', public_id), signature):
+           raise UploadVerificationError('Upload signature does not match')
+       if not os.path.exists(self._path(public_id)):
+           raise UploadVerificationError('Uploaded file not found')
+       return f"{self.base_url}/{public_id}"
+
+   def delete(self, public_id):
+       try:
+           os.remove(self._path(public_id))
+       except FileNotFoundError:
+           pass
+
+   def delete_many(self, public_ids):
+       errors = {}
+       for public_id in public_ids:
+           try:
+               self.delete(public_id)
+           except (OSError, UploadVerificationError) as e:
+               errors[public_id] = str(e)
+       return errors
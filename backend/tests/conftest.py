@@ -0,0 +1,44 @@
+"""Fixtures shared by the API tests: an app on TestingConfig with the schema migrated"""
+
+
+import os
+import sys
+
+import pytest
+from flask_migrate import downgrade, upgrade
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+@pytest.fixture
+def app():
+   app = create_app('testing')
+   with app.app_context():
+       # Migrations rather than create_all: saving an animal also indexes it in the FTS table
+       upgrade(directory=MIGRATIONS)
+       yield app
+       db.session.remove()
+       downgrade(directory=MIGRATIONS, revision='base')
+
+
+@pytest.fixture
+def client(app):
+   return app.test_client()
+
+
+def register(client, name, user_type):
+   response = client.post('/api/auth/register', json={
+       'email': f'{name}@example.com',
+       'password': 'password',
+       'name': name,
+       'userType': user_type,
+       'phone': '0700000000',
+       'location': 'Nakuru'
+   })
+   assert response.status_code == 201, response.json
+   return {'Authorization': f"Bearer {response.json['token']}"}
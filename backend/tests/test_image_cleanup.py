@@ -0,0 +1,119 @@
+"""
+Images uploaded through /api/upload-image are owned by their uploader, so
+removing them from a listing queues them for deletion from storage.
+"""
+
+
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as farmart
+from app import Animal, ImageDeletion, Upload, collect_orphaned_images, db
+from conftest import register
+
+
+class FakeUploader:
+   """Stands in for cloudinary.uploader, answering uploads the way Cloudinary does"""
+
+   def __init__(self):
+       self.uploaded = 0
+
+   def upload(self, file, **options):
+       self.uploaded += 1
+       public_id = f"{options['folder']}/image{self.uploaded}"
+       return {
+           'public_id': public_id,
+           'version': 1700000000,
+           'secure_url': f'https://res.cloudinary.com/demo/image/upload/v1700000000/{public_id}.jpg'
+       }
+
+
+@pytest.fixture
+def uploader(monkeypatch):
+   uploader = FakeUploader()
+   monkeypatch.setattr(farmart, 'get_cloudinary_uploader', lambda: uploader)
+   return uploader
+
+
+def upload_image(client, headers):
+   response = client.post('/api/upload-image', headers=headers, data={'image': (io.BytesIO(b'JPEG'), 'goat.jpg')})
+   assert response.status_code == 200, response.json
+   return response.json
+
+
+def add_animal(client, headers, images):
+   response = client.post('/api/animals', headers=headers, json={
+       'name': 'Daisy',
+       'type': 'Goat',
+       'breed': 'Boer',
+       'age': 2,
+       'weight': 30,
+       'price': 100,
+       'description': 'Healthy',
+       'images': images
+   })
+   assert response.status_code == 201, response.json
+   return response.json['id']
+
+
+def queued_deletions():
+   return {deletion.public_id for deletion in ImageDeletion.query}
+
+
+def test_upload_image_records_the_upload(client, uploader):
+   farmer = register(client, 'farmer', 'farmer')
+   image = upload_image(client, farmer)
+
+   upload = Upload.query.filter_by(public_id=image['publicId']).one()
+   assert upload.status == 'confirmed'
+   assert upload.url == image['imageUrl']
+
+
+def test_deleting_an_animal_queues_its_uploaded_images(client, uploader):
+   farmer = register(client, 'farmer', 'farmer')
+   image = upload_image(client, farmer)
+   animal_id = add_animal(client, farmer, [image['imageUrl']])
+
+   response = client.delete(f'/api/animals/{animal_id}', headers=farmer)
+   assert response.status_code == 200, response.json
+
+   assert queued_deletions() == {image['publicId']}
+
+
+def test_removing_an_image_keeps_it_while_another_listing_uses_it(client, uploader):
+   farmer = register(client, 'farmer', 'farmer')
+   shared, own = upload_image(client, farmer), upload_image(client, farmer)
+   animal_id = add_animal(client, farmer, [shared['imageUrl'], own['imageUrl']])
+   add_animal(client, farmer, [shared['imageUrl']])
+
+   response = client.put(f'/api/animals/{animal_id}', headers=farmer, json={'images': []})
+   assert response.status_code == 200, response.json
+
+   assert queued_deletions() == {own['publicId']}
+
+
+def test_images_of_other_farmers_are_never_queued(client, uploader):
+   owner = register(client, 'owner', 'farmer')
+   other = register(client, 'other', 'farmer')
+   image = upload_image(client, owner)
+   animal_id = add_animal(client, other, [image['imageUrl']])
+
+   response = client.delete(f'/api/animals/{animal_id}', headers=other)
+   assert response.status_code == 200, response.json
+
+   assert queued_deletions() == set()
+   assert Animal.query.count() == 0
+
+
+def test_garbage_collection_keeps_profile_images(client, uploader):
+   farmer = register(client, 'farmer', 'farmer')
+   profile, unused = upload_image(client, farmer), upload_image(client, farmer)
+   response = client.put('/api/profile', headers=farmer, json={'profileImage': profile['imageUrl']})
+   assert response.status_code == 200, response.json
+   Upload.query.update({'confirmed_at': datetime.utcnow() - timedelta(days=30)})
+   db.session.commit()
+
+   assert collect_orphaned_images() == 1
+   assert queued_deletions() == {unused['publicId']}
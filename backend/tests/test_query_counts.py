@@ -0,0 +1,108 @@
+"""
+The list endpoints must issue the same number of SQL statements however many
+rows they return; a count that grows with the rows means an N+1 crept back in.
+
+   cd backend && python -m pytest tests
+"""
+
+
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app import db, listing_cache
+from conftest import register
+
+
+def add_animals(client, farmer, count):
+   ids = []
+   for i in range(count):
+       response = client.post('/api/animals', headers=farmer, json={
+           'name': f'Animal {i}',
+           'type': 'Goat' if i % 2 else 'Cattle',
+           'breed': 'Boer',
+           'age': 1 + i,
+           'weight': 30,
+           'price': 100 + i,
+           'description': 'Healthy'
+       })
+       assert response.status_code == 201, response.json
+       ids.append(response.json['id'])
+   return ids
+
+
+@contextmanager
+def count_statements():
+   statements = []
+
+   def record(conn, cursor, statement, parameters, context, executemany):
+       statements.append(statement)
+
+   event.listen(db.engine, 'before_cursor_execute', record)
+   try:
+       yield statements
+   finally:
+       event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def statements_for(client, path, headers=None):
+   # Warm the user cache first and bypass the listing cache, so only the
+   # endpoint's own queries are counted
+   client.get(path, headers=headers)
+   listing_cache.clear()
+   with count_statements() as statements:
+       response = client.get(path, headers=headers)
+   assert response.status_code == 200, response.json
+   return len(response.json), len(statements)
+
+
+def test_get_animals_statement_count_is_constant(client):
+   farmer = register(client, 'farmer', 'farmer')
+   add_animals(client, farmer, 2)
+   few_rows, few = statements_for(client, '/api/animals')
+   add_animals(client, farmer, 8)
+   many_rows, many = statements_for(client, '/api/animals')
+
+   assert (few_rows, many_rows) == (2, 10)
+   assert few == many
+
+
+def test_get_cart_statement_count_is_constant(client):
+   farmer = register(client, 'farmer', 'farmer')
+   buyer = register(client, 'buyer', 'buyer')
+   animal_ids = add_animals(client, farmer, 10)
+
+   def fill_cart(ids):
+       for animal_id in ids:
+           response = client.post('/api/cart', headers=buyer, json={'animalId': animal_id, 'quantity': 1})
+           assert response.status_code in (200, 201), response.json
+
+   fill_cart(animal_ids[:2])
+   few_rows, few = statements_for(client, '/api/cart', buyer)
+   fill_cart(animal_ids[2:])
+   many_rows, many = statements_for(client, '/api/cart', buyer)
+
+   assert (few_rows, many_rows) == (2, 10)
+   assert few == many
+
+
+def test_get_orders_statement_count_is_constant(client):
+   farmer = register(client, 'farmer', 'farmer')
+   buyer = register(client, 'buyer', 'buyer')
+   animal_ids = add_animals(client, farmer, 10)
+
+   def place_orders(ids):
+       for animal_id in ids:
+           response = client.post('/api/orders', headers=buyer, json={
+               'items': [{'animalId': animal_id, 'quantity': 1}],
+               'shippingAddress': 'Nakuru'
+           })
+           assert response.status_code == 201, response.json
+
+   place_orders(animal_ids[:2])
+   few_rows, few = statements_for(client, '/api/orders', buyer)
+   place_orders(animal_ids[2:])
+   many_rows, many = statements_for(client, '/api/orders', buyer)
+
+   assert (few_rows, many_rows) == (2, 10)
+   assert few == many
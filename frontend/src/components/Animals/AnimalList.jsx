@@ -2,12 +2,12 @@ import React, { useEffect, useState } from 'react';
 import { useDispatch, useSelector } from 'react-redux';
 import { motion } from 'framer-motion';
 import { Search, Filter, X } from 'lucide-react';
-import { fetchAnimals, setFilters, clearFilters } from '../../store/slices/animalSlice';
+import { fetchAnimals, fetchMoreAnimals, setFilters, clearFilters } from '../../store/slices/animalSlice';
 import AnimalCard from './AnimalCard';
 
 const AnimalList = () => {
   const dispatch = useDispatch();
-  const { animals, isLoading, filters } = useSelector((state) => state.animals);
+  const { animals, nextCursor, isLoading, isLoadingMore, filters } = useSelector((state) => state.animals);
   const [showFilters, setShowFilters] = useState(false);
   const [localFilters, setLocalFilters] = useState(filters);
 
@@ -15,6 +15,10 @@ const AnimalList = () => {
     dispatch(fetchAnimals(filters));
   }, [dispatch, filters]);
 
+  const handleLoadMore = () => {
+    dispatch(fetchMoreAnimals(filters));
+  };
+
   const handleSearch = (e) => {
     const search = e.target.value;
     setLocalFilters({ ...localFilters, search });
@@ -194,7 +198,7 @@ const AnimalList = () => {
 
         {/* Results Count */}
         <p className="text-gray-600 mb-4">
-          {animals.length} animal{animals.length !== 1 ? 's' : ''} found
+          {animals.length}{nextCursor ? '+' : ''} animal{animals.length !== 1 || nextCursor ? 's' : ''} found
         </p>
       </div>
 
@@ -204,11 +208,25 @@ const AnimalList = () => {
           <p className="text-gray-500 text-lg">No animals found matching your criteria.</p>
         </div>
       ) : (
-        <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
-          {animals.map((animal) => (
-            <AnimalCard key={animal.id} animal={animal} />
-          ))}
-        </div>
+        <>
+          <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
+            {animals.map((animal) => (
+              <AnimalCard key={animal.id} animal={animal} />
+            ))}
+          </div>
+
+          {nextCursor && (
+            <div className="mt-8 flex justify-center">
+              <button
+                onClick={handleLoadMore}
+                disabled={isLoadingMore}
+                className="px-6 py-2 border border-gray-300 rounded-md hover:bg-gray-50 transition-colors disabled:opacity-50"
+              >
+                {isLoadingMore ? 'Loading...' : 'Load more'}
+              </button>
+            </div>
+          )}
+        </>
       )}
     </div>
   );
@@ -3,7 +3,7 @@ import { useDispatch, useSelector } from 'react-redux';
 import { Link } from 'react-router-dom';
 import { motion } from 'framer-motion';
 import { Plus } from 'lucide-react';
-import { fetchAnimals } from '../../store/slices/animalSlice';
+import { fetchFarmerAnimals } from '../../store/slices/animalSlice';
 import AnimalCard from '../Animals/AnimalCard';
 import EditAnimalModal from './EditAnimalModal';
 
@@ -17,8 +17,10 @@ const FarmerAnimals = () => {
   const farmerAnimals = animals.filter(animal => animal.farmerId === user?.id);
 
   useEffect(() => {
-    dispatch(fetchAnimals());
-  }, [dispatch]);
+    if (user?.id) {
+      dispatch(fetchFarmerAnimals(user.id));
+    }
+  }, [dispatch, user?.id]);
 
   const handleEdit = (animal) => {
     setEditingAnimal(animal);
@@ -16,6 +16,11 @@ api.interceptors.request.use(
     if (token) {
       config.headers.Authorization = `Bearer ${token}`;
     }
+    // Keep reads on the primary database for a moment after our own writes
+    const primaryRead = sessionStorage.getItem('primaryRead');
+    if (primaryRead) {
+      config.headers['X-Primary-Read'] = primaryRead;
+    }
     return config;
   },
   (error) => {
@@ -25,7 +30,13 @@ api.interceptors.request.use(
 
 // Handle token expiration
 api.interceptors.response.use(
-  (response) => response,
+  (response) => {
+    const primaryRead = response.headers['x-primary-read'];
+    if (primaryRead) {
+      sessionStorage.setItem('primaryRead', primaryRead);
+    }
+    return response;
+  },
   (error) => {
     if (error.response?.status === 401) {
       localStorage.removeItem('token');
@@ -1,14 +1,53 @@
 import { createSlice, createAsyncThunk } from '@reduxjs/toolkit';
 import api from '../../services/api';
 
+// The API returns one page of animals per call; X-Next-Cursor points at the next
+const fetchAnimalsPage = async (filters, cursor) => {
+  const params = new URLSearchParams(filters);
+  if (cursor) {
+    params.set('cursor', cursor);
+  }
+  const response = await api.get(`/animals?${params.toString()}`);
+  return { animals: response.data, nextCursor: response.headers['x-next-cursor'] || null };
+};
+
 // Async thunks
 export const fetchAnimals = createAsyncThunk(
   'animals/fetchAnimals',
   async (filters = {}, { rejectWithValue }) => {
     try {
-      const params = new URLSearchParams(filters).toString();
-      const response = await api.get(`/animals?${params}`);
-      return response.data;
+      return await fetchAnimalsPage(filters);
+    } catch (error) {
+      return rejectWithValue(error.response.data.message);
+    }
+  }
+);
+
+export const fetchMoreAnimals = createAsyncThunk(
+  'animals/fetchMoreAnimals',
+  async (filters = {}, { getState, rejectWithValue }) => {
+    try {
+      const cursor = getState().animals.nextCursor;
+      return { ...(await fetchAnimalsPage(filters, cursor)), cursor };
+    } catch (error) {
+      return rejectWithValue(error.response.data.message);
+    }
+  }
+);
+
+// A farmer's own listings are few enough to load in full, page by page
+export const fetchFarmerAnimals = createAsyncThunk(
+  'animals/fetchFarmerAnimals',
+  async (farmerId, { rejectWithValue }) => {
+    try {
+      const animals = [];
+      let cursor = null;
+      do {
+        const page = await fetchAnimalsPage({ farmerId }, cursor);
+        animals.push(...page.animals);
+        cursor = page.nextCursor;
+      } while (cursor);
+      return { animals, nextCursor: null };
     } catch (error) {
       return rejectWithValue(error.response.data.message);
     }
@@ -55,7 +94,9 @@ const animalSlice = createSlice({
   name: 'animals',
   initialState: {
     animals: [],
+    nextCursor: null,
     isLoading: false,
+    isLoadingMore: false,
     error: null,
     filters: {
       type: '',
@@ -96,12 +137,42 @@ const animalSlice = createSlice({
       })
       .addCase(fetchAnimals.fulfilled, (state, action) => {
         state.isLoading = false;
-        state.animals = action.payload;
+        state.animals = action.payload.animals;
+        state.nextCursor = action.payload.nextCursor;
       })
       .addCase(fetchAnimals.rejected, (state, action) => {
         state.isLoading = false;
         state.error = action.payload;
       })
+      .addCase(fetchMoreAnimals.pending, (state) => {
+        state.isLoadingMore = true;
+        state.error = null;
+      })
+      .addCase(fetchMoreAnimals.fulfilled, (state, action) => {
+        state.isLoadingMore = false;
+        // Drop a page that arrives after the filters changed and the list was reloaded
+        if (action.payload.cursor === state.nextCursor) {
+          state.animals.push(...action.payload.animals);
+          state.nextCursor = action.payload.nextCursor;
+        }
+      })
+      .addCase(fetchMoreAnimals.rejected, (state, action) => {
+        state.isLoadingMore = false;
+        state.error = action.payload;
+      })
+      .addCase(fetchFarmerAnimals.pending, (state) => {
+        state.isLoading = true;
+        state.error = null;
+      })
+      .addCase(fetchFarmerAnimals.fulfilled, (state, action) => {
+        state.isLoading = false;
+        state.animals = action.payload.animals;
+        state.nextCursor = action.payload.nextCursor;
+      })
+      .addCase(fetchFarmerAnimals.rejected, (state, action) => {
+        state.isLoading = false;
+        state.error = action.payload;
+      })
       .addCase(addAnimal.fulfilled, (state, action) => {
         state.animals.push(action.payload);
       })